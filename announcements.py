@@ -0,0 +1,271 @@
+import asyncio
+import heapq
+import ipaddress
+import json
+import re
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import aiohttp
+
+# --------------------------------------------------------------------------------
+## Announcement Pipeline (drafts / scheduler / fan-out status)
+# --------------------------------------------------------------------------------
+# ทุกประกาศถูกบันทึกลง SQLite ก่อนส่ง (draft + รายชื่อช่องปลายทาง) แล้วให้ scheduler ส่งตามเวลา
+# สถานะแยกรายช่อง ถ้าบอท restart ระหว่างรอหรือระหว่างส่ง จะส่งต่อเฉพาะช่องที่ยัง pending
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS announcements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    send_at REAL NOT NULL,
+    guild_id INTEGER,
+    author_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_announcements_status ON announcements (status, send_at);
+
+CREATE TABLE IF NOT EXISTS announcement_targets (
+    announcement_id INTEGER NOT NULL REFERENCES announcements (id),
+    channel_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    message_id INTEGER,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (announcement_id, channel_id)
+);
+"""
+
+STATUS_SCHEDULED = "scheduled"
+STATUS_DONE = "done"
+TARGET_PENDING = "pending"
+TARGET_SENT = "sent"
+TARGET_FAILED = "failed"
+
+CHANNEL_ID_RE = re.compile(r"<#(\d+)>|(\d{15,20})")
+IMAGE_MAX_REDIRECTS = 3
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def parse_channel_ids(text):
+    # รับได้ทั้ง ID ตรง ๆ และ mention แบบ <#id> คั่นด้วย comma หรือเว้นวรรค (ตัดตัวซ้ำ คงลำดับเดิม)
+    ids = []
+    for mention, raw_id in CHANNEL_ID_RE.findall(text or ""):
+        channel_id = int(mention or raw_id)
+        if channel_id not in ids:
+            ids.append(channel_id)
+    return ids
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicOnlyResolver(aiohttp.ThreadedResolver):
+    # ใช้ resolve ทุกครั้งที่เชื่อมต่อ ห้ามต่อไปยัง IP ภายใน เช่น 127.0.0.1, 10.x, 169.254.x
+    # (กัน DNS ที่เปลี่ยนคำตอบระหว่างตรวจกับเชื่อมต่อ ส่วน IP literal ตรวจใน is_public_host)
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        results = await super().resolve(host, port, family)
+        if not results or not all(is_public_address(result["host"]) for result in results):
+            raise OSError(f"{host} does not resolve to a public address")
+        return results
+
+
+async def is_public_host(hostname, port):
+    # ใช้กับทุก hop รวม host ที่เป็น IP ตรง ๆ (aiohttp ไม่เรียก resolver สำหรับ IP literal)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return False
+    return bool(infos) and all(is_public_address(info[4][0]) for info in infos)
+
+
+async def validate_image_url(url, timeout=5.0):
+    # ตรวจครั้งเดียวตอนสร้างประกาศ: HEAD แล้วดู Content-Type ว่าเป็นรูปจริง
+    # ยิงได้เฉพาะ host สาธารณะ และไม่บอกรายละเอียดคำตอบ (status / content type) กลับไปให้ผู้ใช้
+    # redirect ตามเองทีละ hop (ไม่เกิน IMAGE_MAX_REDIRECTS) เพื่อตรวจ host ปลายทางทุกครั้งก่อนยิง
+    # คืน (ใช้ได้หรือไม่, เหตุผล)
+    method = "HEAD"
+    redirects = 0
+    try:
+        connector = aiohttp.TCPConnector(resolver=PublicOnlyResolver())
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            while True:
+                parsed = urllib.parse.urlparse(url)
+                if parsed.scheme not in ("http", "https") or not parsed.hostname:
+                    if redirects:
+                        print(f"Warning: Rejected image URL redirect to {url}.")
+                        return False, "เปิดลิงก์รูปภาพไม่ได้"
+                    return False, "ต้องเป็นลิงก์ http(s)"
+                port = parsed.port or (443 if parsed.scheme == "https" else 80)
+                if not await is_public_host(parsed.hostname, port):
+                    print(f"Warning: Rejected image URL {url}: host is not public.")
+                    return False, "เปิดลิงก์รูปภาพไม่ได้"
+                async with session.request(method, url, allow_redirects=False) as response:
+                    status, content_type = response.status, response.headers.get("Content-Type", "")
+                    location = response.headers.get("Location")
+                if status == 405 and method == "HEAD":
+                    # บาง CDN ไม่รับ HEAD
+                    method = "GET"
+                    continue
+                if status in REDIRECT_STATUSES and location:
+                    redirects += 1
+                    if redirects > IMAGE_MAX_REDIRECTS:
+                        print(f"Warning: Image URL {url} redirected too many times.")
+                        return False, "เปิดลิงก์รูปภาพไม่ได้"
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                break
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        print(f"Warning: Could not validate image URL {url}: {e!r}")
+        return False, "เปิดลิงก์รูปภาพไม่ได้"
+    if status >= 400 or not content_type.lower().startswith("image/"):
+        print(f"Warning: Image URL {url} answered HTTP {status} ({content_type or 'no content type'}).")
+        return False, "ลิงก์ไม่ใช่รูปภาพที่เปิดได้"
+    return True, None
+
+
+class AnnouncementStore:
+    def __init__(self, path="announcements.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def create_sync(self, guild_id, author_id, send_at, payload, channel_ids):
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO announcements (created_at, send_at, guild_id, author_id, status, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (now, send_at, guild_id, author_id, STATUS_SCHEDULED, json.dumps(payload, ensure_ascii=False)),
+            )
+            announcement_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO announcement_targets (announcement_id, channel_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(announcement_id, channel_id, TARGET_PENDING, now) for channel_id in channel_ids],
+            )
+            self.conn.commit()
+        return announcement_id
+
+    async def create(self, guild_id, author_id, send_at, payload, channel_ids):
+        return await asyncio.to_thread(self.create_sync, guild_id, author_id, send_at, payload, channel_ids)
+
+    def get_sync(self, announcement_id):
+        # คืน (announcement dict, [target dict]) หรือ None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, created_at, send_at, guild_id, author_id, status, payload FROM announcements WHERE id = ?",
+                (announcement_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            targets = self.conn.execute(
+                "SELECT channel_id, status, message_id, error FROM announcement_targets WHERE announcement_id = ? ORDER BY rowid",
+                (announcement_id,),
+            ).fetchall()
+        announcement = {
+            "id": row[0], "created_at": row[1], "send_at": row[2], "guild_id": row[3],
+            "author_id": row[4], "status": row[5], "payload": json.loads(row[6]),
+        }
+        return announcement, [{"channel_id": t[0], "status": t[1], "message_id": t[2], "error": t[3]} for t in targets]
+
+    async def get(self, announcement_id):
+        return await asyncio.to_thread(self.get_sync, announcement_id)
+
+    def due_sync(self):
+        # ทุกประกาศที่ยังส่งไม่ครบ ใช้ตอนเริ่ม scheduler หลัง restart
+        with self.lock:
+            return self.conn.execute("SELECT id, send_at FROM announcements WHERE status = ?", (STATUS_SCHEDULED,)).fetchall()
+
+    def record_results_sync(self, announcement_id, results):
+        # results = [(channel_id, status, message_id, error)]
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE announcement_targets SET status = ?, message_id = ?, error = ?, updated_at = ? WHERE announcement_id = ? AND channel_id = ?",
+                [(status, message_id, error, now, announcement_id, channel_id) for channel_id, status, message_id, error in results],
+            )
+            pending = self.conn.execute(
+                "SELECT COUNT(*) FROM announcement_targets WHERE announcement_id = ? AND status = ?",
+                (announcement_id, TARGET_PENDING),
+            ).fetchone()[0]
+            if not pending:
+                self.conn.execute("UPDATE announcements SET status = ? WHERE id = ?", (STATUS_DONE, announcement_id))
+            self.conn.commit()
+
+    async def record_results(self, announcement_id, results):
+        await asyncio.to_thread(self.record_results_sync, announcement_id, results)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class AnnouncementScheduler:
+    # heap ของ (send_at, announcement_id) กับ task เดียวที่หลับจนถึงรายการแรก
+    # การเพิ่มรายการใหม่ที่เร็วกว่าจะปลุก task ให้คำนวณเวลารอใหม่
+    def __init__(self, store, deliver):
+        self.store = store
+        self.deliver = deliver
+        self.heap = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.running = set()
+        self.delivered = 0
+
+    async def start(self):
+        if self.task is not None:
+            return
+        for announcement_id, send_at in await asyncio.to_thread(self.store.due_sync):
+            heapq.heappush(self.heap, (send_at, announcement_id))
+        if self.heap:
+            print(f"📢 Resuming {len(self.heap)} scheduled announcement(s).")
+        self.task = asyncio.create_task(self._run())
+
+    def schedule(self, announcement_id, send_at):
+        heapq.heappush(self.heap, (send_at, announcement_id))
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, announcement_id = heapq.heappop(self.heap)
+            task = asyncio.create_task(self._deliver(announcement_id))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _deliver(self, announcement_id):
+        try:
+            await self.deliver(announcement_id)
+            self.delivered += 1
+        except Exception as e:
+            print(f"Error delivering announcement #{announcement_id}: {e}")
+
+    def pending(self):
+        return len(self.heap)
+
+    async def close(self):
+        # ช่องที่ยังไม่ได้ส่งจะค้างเป็น pending ใน SQLite แล้วส่งต่อเมื่อเริ่มใหม่
+        tasks = [self.task, *self.running] if self.task is not None else list(self.running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        self.store.close()
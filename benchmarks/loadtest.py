@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+from aiohttp import web, ClientSession
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --------------------------------------------------------------------------------
+## Load Test: bot.py handlers against a fake Discord API + webhook replayer
+# --------------------------------------------------------------------------------
+# รันบอทจริง (bot.py) แต่ชี้ REST ไปที่ Discord ปลอมในเครื่อง ไม่ต้องมี token จริง
+#
+#   python benchmarks/loadtest.py --pushes 500 --prs 100 --duplicates 0.2 --concurrency 50
+#
+# รายงาน: ACK latency ของ /webhook (p50/p99), end-to-end latency จาก push ถึงข้อความใน Discord,
+# จำนวน 429 ที่จำลองไว้, จำนวน push ที่ส่งถึงจริงเทียบกับที่รับไว้ (exactly-once) และหน่วยความจำที่เพิ่มขึ้น
+
+FAKE_USER = {"id": "100000000000000001", "username": "loadtest", "discriminator": "0", "avatar": None, "global_name": None, "bot": True}
+PUSHES_RE = re.compile(r"in (\d+) push")
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py ตรวจ content-type แบบตรงตัว ("application/json" ไม่มี charset)
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={**(headers or {}), "Content-Type": "application/json"})
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class FakeDiscordAPI:
+    # Discord REST ปลอม: จำกัดอัตราต่อช่องแบบ fixed window และตอบ 429 พร้อม header แบบเดียวกับของจริง
+    def __init__(self, limit=5, per=5.0, random_429=0.0):
+        self.limit = limit
+        self.per = per
+        self.random_429 = random_429
+        self.windows = {}
+        self.next_id = 200000000000000000
+        self.messages = []
+        self.requests = 0
+        self.rate_limited = 0
+        self.app = web.Application()
+        self.app.router.add_get("/api/v10/users/@me", self.get_me)
+        self.app.router.add_get("/api/v10/oauth2/applications/@me", self.get_application)
+        self.app.router.add_post("/api/v10/channels/{channel_id}/messages", self.create_message)
+        self.app.router.add_patch("/api/v10/channels/{channel_id}/messages/{message_id}", self.edit_message)
+        self.app.router.add_get("/github/search/issues", self.search_issues)
+        self.app.router.add_route("*", "/{tail:.*}", self.catch_all)
+
+    def _rate_limit(self, channel_id):
+        now = time.monotonic()
+        started, count = self.windows.get(channel_id, (now, 0))
+        if now - started >= self.per:
+            started, count = now, 0
+        reset_after = self.per - (now - started)
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Bucket": f"channel-{channel_id}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+        }
+        if count >= self.limit or random.random() < self.random_429:
+            self.rate_limited += 1
+            headers["X-RateLimit-Remaining"] = "0"
+            headers["Retry-After"] = f"{reset_after:.3f}"
+            # ไม่มี Via discord.py จะถือว่าโดน Cloudflare แบนและไม่ retry
+            headers["Via"] = "1.1 google"
+            body = {"message": "You are being rate limited.", "retry_after": round(reset_after, 3), "global": False}
+            return json_response(body, status=429, headers=headers)
+        self.windows[channel_id] = (started, count + 1)
+        headers["X-RateLimit-Remaining"] = str(self.limit - count - 1)
+        return headers
+
+    def _message(self, channel_id, payload, message_id=None):
+        if message_id is None:
+            self.next_id += 1
+            message_id = self.next_id
+        return {
+            "id": str(message_id), "channel_id": str(channel_id), "type": 0, "content": payload.get("content") or "",
+            "author": FAKE_USER, "timestamp": "2025-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+            "embeds": payload.get("embeds") or [], "components": payload.get("components") or [], "pinned": False, "flags": 0,
+        }
+
+    async def get_me(self, request):
+        return json_response(FAKE_USER)
+
+    async def get_application(self, request):
+        return json_response({"id": FAKE_USER["id"], "name": "loadtest", "description": "", "icon": None, "bot_public": True,
+                             "bot_require_code_grant": False, "owner": FAKE_USER, "verify_key": "0" * 64, "flags": 0})
+
+    async def create_message(self, request):
+        self.requests += 1
+        channel_id = request.match_info["channel_id"]
+        limited = self._rate_limit(channel_id)
+        if isinstance(limited, web.Response):
+            return limited
+        payload = await self._json_payload(request)
+        self.messages.append((time.monotonic(), payload))
+        return json_response(self._message(channel_id, payload), headers=limited)
+
+    async def edit_message(self, request):
+        self.requests += 1
+        channel_id = request.match_info["channel_id"]
+        limited = self._rate_limit(channel_id)
+        if isinstance(limited, web.Response):
+            return limited
+        payload = await self._json_payload(request)
+        self.messages.append((time.monotonic(), payload))
+        return json_response(self._message(channel_id, payload, request.match_info["message_id"]), headers=limited)
+
+    async def search_issues(self, request):
+        return json_response({"total_count": random.randint(0, 20), "items": []})
+
+    async def catch_all(self, request):
+        print(f"FakeDiscordAPI: unhandled {request.method} {request.path}")
+        return json_response({"message": "Unknown", "code": 0}, status=404)
+
+    async def _json_payload(self, request):
+        if request.content_type == "multipart/form-data":
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "payload_json":
+                    return json.loads(await part.text())
+            return {}
+        return await request.json()
+
+
+def push_payload(repo, branch, seq):
+    sha = uuid.uuid4().hex + "00000000"
+    commit = {"id": sha, "message": f"Load test commit {seq}", "url": f"https://github.com/loadtest/{repo}/commit/{sha}",
+              "author": {"name": f"dev{seq % 5}", "email": f"dev{seq % 5}@example.com"}}
+    return {
+        "ref": f"refs/heads/{branch}", "before": "0" * 40, "after": sha, "compare": f"https://github.com/loadtest/{repo}/compare/x...y",
+        "repository": {"name": repo, "full_name": f"loadtest/{repo}", "html_url": f"https://github.com/loadtest/{repo}"},
+        "commits": [commit], "head_commit": commit,
+    }
+
+def pr_payload(repo, seq):
+    action = "opened" if seq % 2 == 0 else "closed"
+    return {"action": action, "number": seq, "pull_request": {"state": "open" if action == "opened" else "closed"},
+            "repository": {"name": repo, "full_name": f"loadtest/{repo}", "html_url": f"https://github.com/loadtest/{repo}"}}
+
+def build_events(args):
+    rng = random.Random(args.seed)
+    events = []
+    for seq in range(args.pushes):
+        repo, branch = f"repo{seq % args.repos}", f"branch{seq % args.branches}"
+        events.append({"event": "push", "key": (repo, branch), "delivery": str(uuid.uuid4()), "body": json.dumps(push_payload(repo, branch, seq)).encode()})
+    for seq in range(args.prs):
+        events.append({"event": "pull_request", "key": None, "delivery": str(uuid.uuid4()), "body": json.dumps(pr_payload(f"repo{seq % args.repos}", seq)).encode()})
+    rng.shuffle(events)
+    # delivery ซ้ำ (id + body เดิม) แทรกไว้ด้านหลังของต้นฉบับ เหมือน GitHub retry/redeliver
+    duplicates = [dict(event, duplicate=True) for event in rng.sample(events, int(len(events) * args.duplicates))]
+    for duplicate in duplicates:
+        events.insert(rng.randint(events.index(next(e for e in events if e["delivery"] == duplicate["delivery"])) + 1, len(events)), duplicate)
+    return events
+
+
+async def fire(url, secret, events, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def send(session, event):
+        signature = "sha256=" + hmac.new(secret.encode(), event["body"], hashlib.sha256).hexdigest()
+        headers = {"X-GitHub-Event": event["event"], "X-GitHub-Delivery": event["delivery"], "X-Hub-Signature-256": signature, "Content-Type": "application/json"}
+        async with semaphore:
+            sent = time.monotonic()
+            async with session.post(url, data=event["body"], headers=headers) as resp:
+                await resp.read()
+                results.append({**event, "sent": sent, "ack": time.monotonic() - sent, "status": resp.status})
+
+    async with ClientSession() as session:
+        await asyncio.gather(*(send(session, event) for event in events))
+    return results
+
+
+def end_to_end(results, messages):
+    # จับคู่ข้อความที่ Discord ปลอมได้รับกับ push ที่ส่งไป ตาม (repo, branch) และจำนวน push ในแต่ละ batch
+    pending = {}
+    for result in sorted(results, key=lambda r: r["sent"]):
+        if result["event"] == "push" and result["status"] == 200 and not result.get("duplicate"):
+            pending.setdefault(result["key"], []).append(result["sent"])
+    latencies = []
+    delivered = 0
+    for arrived, payload in messages:
+        embed = (payload.get("embeds") or [{}])[0]
+        fields = {field["name"]: field["value"] for field in embed.get("fields", [])}
+        match = PUSHES_RE.search(fields.get("Commits", ""))
+        key = (fields.get("Repo"), fields.get("Branch"))
+        if not match or key not in pending:
+            continue
+        count = int(match.group(1))
+        delivered += count
+        batch, pending[key] = pending[key][:count], pending[key][count:]
+        latencies.extend(arrived - sent for sent in batch)
+    return latencies, delivered
+
+
+async def run(args):
+    fake = FakeDiscordAPI(limit=args.rate_limit, per=args.rate_window, random_429=args.random_429)
+    fake_runner = web.AppRunner(fake.app)
+    await fake_runner.setup()
+    await web.TCPSite(fake_runner, "127.0.0.1", args.fake_port).start()
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.update({
+        "DISCORD_TOKEN": "loadtest.token", "DASHBOARD_CHANNEL_ID": "300000000000000001", "GITHUB_WEBHOOK_SECRET": args.secret,
+        "PORT": str(args.port), "PUSH_DEBOUNCE_SECONDS": str(args.debounce), "GITHUB_API_URL": f"{fake_url}/github",
+        "SESSION_STORE_PATH": os.path.join(tmp, "session.json"), "SESSION_HISTORY_PATH": os.path.join(tmp, "history.db"),
+        "REPO_STATS_PATH": os.path.join(tmp, "repo_stats.json"), "WEBHOOK_DEDUP_PATH": os.path.join(tmp, "deliveries.db"),
+        "ANNOUNCEMENT_DB_PATH": os.path.join(tmp, "announcements.db"),
+    })
+
+    import discord
+    discord.http.Route.BASE = f"{fake_url}/api/v10"
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    import bot
+
+    await bot.bot.login(os.environ["DISCORD_TOKEN"])
+    # ไม่มี gateway จริง จึงตั้งสถานะ ready เองเพื่อให้ wait_until_ready() ผ่าน
+    bot.bot._ready.set()
+    await bot.start_webhook_server()
+
+    events = build_events(args)
+    print(f"Firing {len(events)} webhook deliveries ({args.pushes} push, {args.prs} pull_request, {len(events) - args.pushes - args.prs} duplicate) ...")
+    started = time.monotonic()
+    results = await fire(f"http://127.0.0.1:{args.port}/webhook", args.secret, events, args.concurrency)
+    fire_seconds = time.monotonic() - started
+
+    accepted = sum(1 for r in results if r["event"] == "push" and r["status"] == 200 and not r.get("duplicate"))
+    deadline = time.monotonic() + args.debounce + args.timeout
+    while time.monotonic() < deadline:
+        if end_to_end(results, fake.messages)[1] >= accepted:
+            break
+        await asyncio.sleep(0.1)
+    await bot.bot.close()
+    await fake_runner.cleanup()
+
+    latencies, delivered = end_to_end(results, fake.messages)
+    acks = [r["ack"] for r in results]
+    statuses = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    rss_end = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"Sent {len(results)} deliveries in {fire_seconds:.2f}s ({len(results) / fire_seconds:.0f}/s), statuses {statuses}")
+    print(f"ACK latency:        p50={percentile(acks, 50) * 1000:.1f}ms p99={percentile(acks, 99) * 1000:.1f}ms max={max(acks) * 1000:.1f}ms")
+    if latencies:
+        print(f"End-to-end latency: p50={percentile(latencies, 50) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms (debounce {args.debounce}s)")
+    print(f"Discord API: {len(fake.messages)} message(s), {fake.requests} request(s), {fake.rate_limited} simulated 429(s)")
+    print(f"Pushes delivered {delivered} / accepted {accepted}; duplicates acknowledged {statuses.get(200, 0) - accepted - sum(1 for r in results if r['event'] == 'pull_request' and not r.get('duplicate') and r['status'] == 200)}")
+    print(f"Peak RSS: {rss_start / 1024:.1f} MiB -> {rss_end / 1024:.1f} MiB")
+    if delivered != accepted:
+        print("FAIL: delivered pushes do not match accepted pushes (lost or duplicated notifications)")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test bot.py webhook handling against a fake Discord API.")
+    parser.add_argument("--pushes", type=int, default=300)
+    parser.add_argument("--prs", type=int, default=50)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of deliveries to replay")
+    parser.add_argument("--repos", type=int, default=3)
+    parser.add_argument("--branches", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--debounce", type=float, default=1.0)
+    parser.add_argument("--rate-limit", type=int, default=5, help="messages per channel per window before 429")
+    parser.add_argument("--rate-window", type=float, default=5.0)
+    parser.add_argument("--random-429", type=float, default=0.0, help="extra probability of a 429 on any call")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--fake-port", type=int, default=5056)
+    parser.add_argument("--secret", default="loadtest-secret")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
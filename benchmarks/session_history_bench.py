@@ -0,0 +1,74 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_history import SessionHistory
+
+# --------------------------------------------------------------------------------
+## Benchmark: /session stats on a large synthetic history
+# --------------------------------------------------------------------------------
+# python benchmarks/session_history_bench.py --sessions 300000 --max-ms 50
+
+BKK = datetime.timezone(datetime.timedelta(hours=7))
+
+
+def generate(history, sessions, guilds, users, batch=5000):
+    rng = random.Random(42)
+    names = [f"user{i}" for i in range(users)]
+    start = datetime.datetime(2023, 1, 1, tzinfo=BKK)
+    span = int((datetime.datetime.now(BKK) - start).total_seconds())
+    records = []
+    for i in range(sessions):
+        start_dt = start + datetime.timedelta(seconds=rng.randrange(span))
+        end_dt = start_dt + datetime.timedelta(minutes=rng.randint(5, 240))
+        participants = [(index + 1, names[index]) for index in rng.sample(range(users), rng.randint(1, 5))]
+        records.append((rng.randrange(guilds) + 1, 1000 + i % 50, "main", participants[0][1], "https://example.com/join", participants, start_dt, end_dt))
+        if len(records) >= batch:
+            history.record_many(records)
+            records.clear()
+    if records:
+        history.record_many(records)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session history stats queries.")
+    parser.add_argument("--sessions", type=int, default=300000)
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--max-ms", type=float, default=50.0, help="fail if p99 query latency exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = SessionHistory(os.path.join(tmp, "history.db"))
+        t0 = time.perf_counter()
+        names = generate(history, args.sessions, args.guilds, args.users)
+        print(f"Generated {args.sessions} sessions in {time.perf_counter() - t0:.1f}s")
+
+        rng = random.Random(7)
+        latencies = []
+        for _ in range(args.queries):
+            q0 = time.perf_counter()
+            history.stats_sync(rng.randrange(args.guilds) + 1, rng.randrange(len(names)) + 1)
+            latencies.append((time.perf_counter() - q0) * 1000)
+        history.close()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"stats query: p50={p50:.2f}ms p99={p99:.2f}ms max={latencies[-1]:.2f}ms")
+    if p99 > args.max_ms:
+        print(f"FAIL: p99 {p99:.2f}ms exceeds {args.max_ms}ms")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import webhook_ingest
+from webhook_ingest import normalize_event
+
+# --------------------------------------------------------------------------------
+## Micro-benchmark: webhook verify + parse + normalise
+# --------------------------------------------------------------------------------
+# python benchmarks/webhook_parse_bench.py --commits 1 20 200 2000
+# python benchmarks/webhook_parse_bench.py --payload recorded_push.json
+
+SECRET = b"benchmark-secret"
+
+
+def make_push_payload(commits):
+    repository = {"id": 1, "name": "repo", "full_name": "owner/repo", "html_url": "https://github.com/owner/repo", "private": False,
+                  "description": "x" * 200, **{f"extra_{i}": f"https://api.github.com/repos/owner/repo/{i}" for i in range(60)}}
+    commit_list = [{
+        "id": f"{i:040x}",
+        "message": f"Commit number {i}\n\n" + "Body line. " * 20,
+        "timestamp": "2025-10-04T10:15:00+07:00",
+        "url": f"https://github.com/owner/repo/commit/{i:040x}",
+        "author": {"name": f"Author {i % 7}", "email": f"author{i % 7}@example.com", "username": f"author{i % 7}"},
+        "committer": {"name": "GitHub", "email": "noreply@github.com", "username": "web-flow"},
+        "added": [f"src/file_{i}_{j}.py" for j in range(3)],
+        "removed": [],
+        "modified": [f"src/module_{j}.py" for j in range(5)],
+    } for i in range(commits)]
+    return {
+        "ref": "refs/heads/main",
+        "before": "0" * 39 + "1",
+        "after": f"{commits:040x}",
+        "compare": "https://github.com/owner/repo/compare/a...b",
+        "repository": repository,
+        "pusher": {"name": "author0", "email": "author0@example.com"},
+        "sender": {"login": "author0", "id": 1},
+        "commits": commit_list,
+        "head_commit": commit_list[-1] if commit_list else None,
+    }
+
+
+def bench(label, body, loads, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        mac = hmac.new(SECRET, digestmod=hashlib.sha256)
+        mac.update(body)
+        mac.hexdigest()
+        normalize_event("push", "delivery", loads(body))
+    elapsed = (time.perf_counter() - t0) / iterations
+    print(f"  {label:<8} {elapsed * 1e6:10.1f} µs/payload  {len(body) / elapsed / 1e6:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webhook payload verification and parsing.")
+    parser.add_argument("--commits", type=int, nargs="+", default=[1, 20, 200, 2000])
+    parser.add_argument("--payload", nargs="*", default=[], help="recorded push payload JSON files")
+    parser.add_argument("--seconds", type=float, default=1.0, help="approximate time budget per case")
+    args = parser.parse_args()
+
+    cases = [(f"{n} commits", json.dumps(make_push_payload(n)).encode()) for n in args.commits]
+    for path in args.payload:
+        with open(path, "rb") as f:
+            cases.append((os.path.basename(path), f.read()))
+
+    backends = [("json", json.loads)]
+    if webhook_ingest.loads_json is not json.loads:
+        backends.append(("orjson", webhook_ingest.loads_json))
+    else:
+        print("orjson is not installed, benchmarking the stdlib json backend only.")
+
+    for label, body in cases:
+        print(f"{label} ({len(body) / 1024:.1f} KiB)")
+        for backend, loads in backends:
+            t0 = time.perf_counter()
+            loads(body)
+            one = max(time.perf_counter() - t0, 1e-6)
+            bench(backend, body, loads, max(1, int(args.seconds / one / 2)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
+import time
+# จับเวลาตั้งแต่ก่อน import discord/aiohttp เพื่อดูว่าแต่ละช่วงของการเริ่มระบบใช้เวลาเท่าไร
+STARTUP_STARTED = time.perf_counter()
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
 import os
 from dotenv import load_dotenv
 import asyncio
 from aiohttp import web
-import hmac
-import hashlib
-import urllib.parse
 import datetime
-import pytz
+import math
+import zoneinfo
+from webhook_queue import WebhookQueue
+from push_coalescer import PushCoalescer
+from repo_stats import RepoStatsIndex
+from session_store import SessionStore, DEFAULT_SESSION_ID
+from session_engine import SessionEngine
+from session_history import SessionHistory
+from rest_scheduler import RestScheduler, PRIORITY_HIGH, LANE_NAMES
+from message_cache import MessageCache
+from webhook_ingest import make_webhook_handler, handle_metrics
+import metrics
+from handoff import HandoffQueue
+from delivery_dedup import DeliveryDedup
+from command_sync import sync_if_changed
+from json_store import load_json, write_json_atomic
+from announcements import AnnouncementStore, AnnouncementScheduler, parse_channel_ids, validate_image_url, TARGET_SENT, TARGET_FAILED, TARGET_PENDING
 
 # โหลด Environment Variables
 load_dotenv()
@@ -18,156 +33,431 @@ load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 DASHBOARD_CHANNEL_ID = int(os.getenv("DASHBOARD_CHANNEL_ID"))
 GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", 10))
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", 5 * 1024 * 1024))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 30))
+# ตั้งค่านี้เมื่อรัน github_webhook.py แยก process (ต้องชี้ไฟล์เดียวกัน)
+WEBHOOK_HANDOFF_PATH = os.getenv("WEBHOOK_HANDOFF_PATH")
+WEBHOOK_HANDOFF_POLL = float(os.getenv("WEBHOOK_HANDOFF_POLL", 0.2))
+WEBHOOK_DEDUP_PATH = os.getenv("WEBHOOK_DEDUP_PATH", "webhook_deliveries.db")
+WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", 24 * 3600))
+PUSH_DEBOUNCE_SECONDS = float(os.getenv("PUSH_DEBOUNCE_SECONDS", 10))
+PUSH_MAX_DELAY_SECONDS = float(os.getenv("PUSH_MAX_DELAY_SECONDS", 60))
+PUSH_MAX_PENDING = int(os.getenv("PUSH_MAX_PENDING", 500))
+GITHUB_DASHBOARD_EDIT_IN_PLACE = os.getenv("GITHUB_DASHBOARD_EDIT_IN_PLACE", "").lower() in ("1", "true", "yes")
+GITHUB_DASHBOARD_MESSAGE_ID = int(os.getenv("GITHUB_DASHBOARD_MESSAGE_ID", 0)) or None
+GITHUB_DASHBOARD_STATE_PATH = os.getenv("GITHUB_DASHBOARD_STATE_PATH", "github_dashboard.json")
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+REPO_STATS_PATH = os.getenv("REPO_STATS_PATH", "repo_stats.json")
+REPO_STATS_RECONCILE_INTERVAL = int(os.getenv("REPO_STATS_RECONCILE_INTERVAL", 6 * 3600))
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "session.json")
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", 256))
+SESSION_HISTORY_PATH = os.getenv("SESSION_HISTORY_PATH", "session_history.db")
+COMMAND_SYNC_STATE_PATH = os.getenv("COMMAND_SYNC_STATE_PATH", "command_sync.json")
+ANNOUNCEMENT_DB_PATH = os.getenv("ANNOUNCEMENT_DB_PATH", "announcements.db")
+ANNOUNCEMENT_MAX_TARGETS = int(os.getenv("ANNOUNCEMENT_MAX_TARGETS", 100))
+# ว่างไว้ = ใช้ /session ได้ทุกช่อง, ใส่ ID คั่นด้วย comma เพื่อจำกัดช่อง
+SESSION_CHANNEL_IDS = {int(x) for x in os.getenv("SESSION_CHANNEL_IDS", "").split(",") if x.strip()}
+DISCORD_REST_WORKERS = int(os.getenv("DISCORD_REST_WORKERS", 4))
+DISCORD_CHANNEL_RATE = float(os.getenv("DISCORD_CHANNEL_RATE", 1.0))
+DISCORD_CHANNEL_BURST = int(os.getenv("DISCORD_CHANNEL_BURST", 5))
+DISCORD_REST_LANE_SIZE = int(os.getenv("DISCORD_REST_LANE_SIZE", 1000))
 
 ALLOWED_ANNOUNCER_ROLES = [
     1423975320821829683
 ]
 
+BKK_TIMEZONE = zoneinfo.ZoneInfo("Asia/Bangkok")
+
+def log_startup_phase(phase):
+    print(f"⏱️ Startup: {phase} (+{time.perf_counter() - STARTUP_STARTED:.3f}s)")
+
 # การตั้งค่า Bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+class DashboardBot(commands.Bot):
+    async def setup_hook(self):
+        rest_scheduler.start()
+        await announcement_scheduler.start()
+        # จับเวลาทุก REST call ที่ผ่าน HTTPClient ของบอท แยกตาม route
+        original_request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original_request(route, **kwargs)
+            finally:
+                DISCORD_REST_SECONDS.labels(f"{route.method} {route.path}").observe(time.perf_counter() - start)
+
+        self.http.request = timed_request
+        self.loop_lag_task = asyncio.create_task(metrics.monitor_event_loop_lag(EVENT_LOOP_LAG_SECONDS))
+        log_startup_phase("logged in")
+
+    async def close(self):
+        # ส่ง event ที่ค้างในคิวให้หมดก่อนตัดการเชื่อมต่อ Discord
+        await stop_webhook_server()
+        await announcement_scheduler.close()
+        await rest_scheduler.drain(WEBHOOK_DRAIN_TIMEOUT)
+        await session_store.close()
+        session_history.close()
+        await super().close()
+
+bot = DashboardBot(command_prefix="!", intents=intents)
+
+# Metrics
+DISCORD_REST_SECONDS = metrics.histogram("discord_rest_seconds", "Discord REST call latency by route.", ("route",))
+COMMAND_SECONDS = metrics.histogram("command_seconds", "Slash command handling time.", ("command",))
+EVENT_LOOP_LAG_SECONDS = metrics.histogram("event_loop_lag_seconds", "Extra delay observed on a periodic event loop sleep.")
+metrics.gauge("discord_gateway_latency_seconds", "Discord gateway heartbeat latency.").set_function(lambda: bot.latency if math.isfinite(bot.latency) else None)
+message_cache = MessageCache(MESSAGE_CACHE_SIZE)
+rest_scheduler = RestScheduler(workers=DISCORD_REST_WORKERS, channel_rate=DISCORD_CHANNEL_RATE, channel_burst=DISCORD_CHANNEL_BURST, lane_maxsize=DISCORD_REST_LANE_SIZE)
 
 # โหลดหรือเริ่มต้นข้อมูล Session
-try:
-    with open("session.json", "r") as f:
-        session_data = json.load(f)
-except FileNotFoundError:
-    session_data = {}
+session_store = SessionStore(SESSION_STORE_PATH, legacy_channel_id=DASHBOARD_CHANNEL_ID)
+session_engine = SessionEngine(session_store)
+session_history = SessionHistory(SESSION_HISTORY_PATH)
+
+# ประกาศที่ตั้งเวลาไว้ต้องอยู่รอดข้ามการ restart
+announcement_store = AnnouncementStore(ANNOUNCEMENT_DB_PATH)
+announcement_scheduler = AnnouncementScheduler(announcement_store, lambda announcement_id: deliver_announcement(announcement_id))
 
 # --------------------------------------------------------------------------------
 ## GitHub Webhook Helper Functions
 # --------------------------------------------------------------------------------
 
-def verify_signature(request_body, signature):
-    if not GITHUB_WEBHOOK_SECRET:
-        print("ERROR: GITHUB_WEBHOOK_SECRET is not set.")
-        return False
-    mac = hmac.new(GITHUB_WEBHOOK_SECRET.encode(), msg=request_body, digestmod=hashlib.sha256)
-    expected = "sha256=" + mac.hexdigest()
-    return hmac.compare_digest(expected, signature)
+repo_stats = RepoStatsIndex(REPO_STATS_PATH, github_token=GITHUB_TOKEN, reconcile_interval=REPO_STATS_RECONCILE_INTERVAL, api_url=GITHUB_API_URL)
+
+def load_github_dashboard_message_id():
+    # ใช้ข้อความที่บอทสร้างไว้รอบก่อน (ต้องเป็นช่องเดียวกัน) จะได้ไม่ post + pin ข้อความใหม่ทุกครั้งที่ restart
+    # ถ้ายังไม่เคยสร้าง ใช้ค่าจาก env แทน
+    state = load_json(GITHUB_DASHBOARD_STATE_PATH, {})
+    if isinstance(state, dict) and state.get("channel_id") == DASHBOARD_CHANNEL_ID and state.get("message_id"):
+        return state["message_id"]
+    return GITHUB_DASHBOARD_MESSAGE_ID
 
-async def update_github_embed(payload, bot_client):
+async def save_github_dashboard_message_id(message_id):
+    try:
+        await asyncio.to_thread(write_json_atomic, GITHUB_DASHBOARD_STATE_PATH, {"channel_id": DASHBOARD_CHANNEL_ID, "message_id": message_id})
+    except OSError as e:
+        print(f"Warning: Could not save GitHub dashboard message id: {e}")
+
+github_dashboard_message_id = load_github_dashboard_message_id()
+# worker ของ WebhookQueue หลายตัวอาจเจอว่ายังไม่มีข้อความพร้อมกัน ให้สร้าง/แก้ข้อความ dashboard ได้ทีละตัว
+github_dashboard_lock = asyncio.Lock()
+
+def build_github_embed(batch):
+    embed = discord.Embed(title="📦 GitHub Repo Status", color=0x3498db)
+    embed.add_field(name="Repo", value=batch.repo_name, inline=False)
+    embed.add_field(name="Branch", value=batch.branch, inline=True)
+    embed.add_field(name="Commits", value=f"📝 {batch.commit_count} commit(s) in {batch.pushes} push(es)", inline=True)
+    embed.add_field(name="Authors", value=batch.author_summary()[:1024], inline=False)
+    if batch.head_message is not None:
+        last_commit = batch.head_message.splitlines()[0][:200] if batch.head_message else "-"
+        embed.add_field(name="Last Commit", value=f"[📝 {last_commit} by {batch.head_author}]({batch.head_url})", inline=False)
+    if batch.compare_url:
+        embed.add_field(name="Changes", value=f"[🔍 Compare]({batch.compare_url})", inline=True)
+    open_prs, open_issues = repo_stats.get(batch.full_name)
+    embed.add_field(name="PRs Open", value=f"🔄 {'-' if open_prs is None else open_prs}", inline=True)
+    embed.add_field(name="Issues Open", value=f"⚠️ {'-' if open_issues is None else open_issues}", inline=True)
+    embed.timestamp = datetime.datetime.now(datetime.timezone.utc)
+    return embed
+
+async def update_github_embed(batch, bot_client):
     await bot_client.wait_until_ready()
-    channel = bot_client.get_channel(DASHBOARD_CHANNEL_ID)
-    if channel is None:
-        print(f"ERROR: Dashboard channel with ID {DASHBOARD_CHANNEL_ID} not found.")
-        return
+    # ส่งผ่าน PartialMessageable ได้เลย ไม่ต้องพึ่ง channel cache ของ gateway (ถ้าช่องไม่มีจริงจะได้ NotFound ใน except)
+    channel = bot_client.get_channel(DASHBOARD_CHANNEL_ID) or bot_client.get_partial_messageable(DASHBOARD_CHANNEL_ID)
     try:
-        embed = discord.Embed(title="📦 GitHub Repo Status", color=0x3498db)
-        repo_name = payload["repository"]["name"]
-        branch = payload.get("ref", "unknown/ref").split("/")[-1]
-        last_commit = payload["head_commit"]["message"]
-        author = payload["head_commit"]["author"]["name"]
-        commit_url = payload["head_commit"]["url"]
-
-        embed.add_field(name="Repo", value=repo_name, inline=False)
-        embed.add_field(name="Branch", value=branch, inline=True)
-        embed.add_field(name="Last Commit", value=f"[📝 {last_commit} by {author}]({commit_url})", inline=False)
-        embed.add_field(name="PRs Open", value="🔄 2", inline=True)
-        embed.add_field(name="Issues Open", value="⚠️ 3", inline=True)
-
+        if repo_stats.needs_reconcile(batch.full_name):
+            await repo_stats.reconcile(batch.full_name)
+        embed = build_github_embed(batch)
         view = discord.ui.View()
-        view.add_item(discord.ui.Button(label="View Repository", url=payload["repository"]["html_url"], style=discord.ButtonStyle.link))
+        view.add_item(discord.ui.Button(label="View Repository", url=batch.html_url, style=discord.ButtonStyle.link))
 
-        await channel.send(embed=embed, view=view)
-        print(f"Successfully sent GitHub notification for push on branch {branch}")
+        if GITHUB_DASHBOARD_EDIT_IN_PLACE:
+            await update_github_dashboard_message(channel, embed, view, batch)
+            return
+        await rest_scheduler.submit(channel.id, lambda: channel.send(embed=embed, view=view))
+        print(f"Successfully sent GitHub notification for {batch.pushes} push(es) on branch {batch.branch}")
     except Exception as e:
         print(f"Error processing or sending GitHub embed: {e}")
 
+async def update_github_dashboard_message(channel, embed, view, batch):
+    global github_dashboard_message_id
+    async with github_dashboard_lock:
+        if github_dashboard_message_id:
+            try:
+                # แก้ข้อความ dashboard เดิมตรง ๆ ไม่ต้อง fetch ก่อน
+                partial = channel.get_partial_message(github_dashboard_message_id)
+                await rest_scheduler.submit(channel.id, lambda: partial.edit(embed=embed, view=view))
+                print(f"Updated GitHub dashboard for {batch.repo_name}/{batch.branch} ({batch.pushes} push(es))")
+                return
+            except discord.NotFound:
+                print(f"Warning: GitHub dashboard message {github_dashboard_message_id} not found, posting a new one.")
+                github_dashboard_message_id = None
+
+        message = await rest_scheduler.submit(channel.id, lambda: channel.send(embed=embed, view=view))
+        github_dashboard_message_id = message.id
+        await save_github_dashboard_message_id(message.id)
+        try:
+            await rest_scheduler.submit(channel.id, message.pin)
+        except discord.HTTPException as e:
+            print(f"Warning: Could not pin GitHub dashboard message: {e}")
+        print(f"Posted new GitHub dashboard message {message.id} for {batch.repo_name}/{batch.branch}")
+
 # --------------------------------------------------------------------------------
 ## Timezone Helper Function
 # --------------------------------------------------------------------------------
 
+def get_bkk_now():
+    return datetime.datetime.now(BKK_TIMEZONE)
+
 def get_bkk_time():
-    bkk_timezone = pytz.timezone('Asia/Bangkok')
-    now = datetime.datetime.now(bkk_timezone)
-    return now.strftime("%Y-%m-%d %H:%M:%S")
+    return get_bkk_now().strftime("%Y-%m-%d %H:%M:%S")
+
+def get_session_start(session):
+    # session ใหม่เก็บ start_ts (epoch) ไว้แล้ว, session รุ่นเก่ามีแค่ string จึงต้อง parse
+    if session.get("start_ts") is not None:
+        return datetime.datetime.fromtimestamp(session["start_ts"], BKK_TIMEZONE)
+    return datetime.datetime.strptime(session["start_time"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=BKK_TIMEZONE)
+
+def format_week(week_ts):
+    return datetime.datetime.fromtimestamp(week_ts, BKK_TIMEZONE).strftime("%Y-%m-%d")
+
+def format_duration(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    return f"{hours} ชั่วโมง {minutes} นาที"
 
 # --------------------------------------------------------------------------------
 ## Aiohttp application setup (Webhook Server)
 # --------------------------------------------------------------------------------
 webhook_app = web.Application()
-
-async def handle_webhook(request):
-    body = await request.read()
-    signature = request.headers.get("X-Hub-Signature-256")
-    if not signature or not verify_signature(body, signature):
-        print("Webhook received with Invalid signature.")
-        return web.Response(status=401, text="Invalid signature")
-
-    event = request.headers.get("X-GitHub-Event")
-    try:
-        payload = json.loads(body)
-    except json.JSONDecodeError:
-        print("Failed to decode webhook JSON payload.")
-        return web.Response(status=400, text="Invalid JSON")
-
-    if event == "push" and payload.get("ref", "").startswith("refs/heads/"):
-        asyncio.create_task(update_github_embed(payload, bot))
-        print(f"Received and scheduled push event for repo {payload['repository']['name']}")
-    else:
-        print(f"Received GitHub event: {event}. Ignoring.")
-
-    return web.Response(text="OK")
-
-webhook_app.router.add_post("/webhook", handle_webhook)
+webhook_runner = None
+# push -> coalescer (รวมตาม repo/branch) -> คิวส่งขนาดจำกัด -> worker ส่ง embed ไป Discord
+webhook_queue = WebhookQueue(lambda batch: update_github_embed(batch, bot), maxsize=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS)
+push_coalescer = PushCoalescer(webhook_queue.submit, window=PUSH_DEBOUNCE_SECONDS, max_delay=PUSH_MAX_DELAY_SECONDS, max_pending=PUSH_MAX_PENDING)
+
+webhook_handoff = HandoffQueue(WEBHOOK_HANDOFF_PATH) if WEBHOOK_HANDOFF_PATH else None
+handoff_task = None
+delivery_dedup = DeliveryDedup(WEBHOOK_DEDUP_PATH, ttl=WEBHOOK_DEDUP_TTL)
+
+async def dispatch_event(event):
+    # event ที่ normalise แล้ว ไม่ว่าจะมาจาก /webhook ในบอทเอง หรือจาก handoff ของ github_webhook.py
+    if event["event"] == "push":
+        return push_coalescer.add(event)
+    if repo_stats.apply_event(event["event"], event):
+        print(f"Updated repo stats from {event['event']}.{event.get('action')} for {event['repository']['full_name']}")
+    return True
+
+async def handle_webhook_stats(request):
+    return web.json_response({"queue": webhook_queue.stats(), "coalescer": push_coalescer.stats(), "rest": rest_scheduler.stats(), "message_cache": message_cache.stats(), "dedup": delivery_dedup.stats(), "handoff": {"delivered": webhook_handoff.delivered, "errors": webhook_handoff.errors} if webhook_handoff else None})
+
+webhook_app.router.add_post("/webhook", make_webhook_handler(GITHUB_WEBHOOK_SECRET, dispatch_event, retry_after=WEBHOOK_RETRY_AFTER, dedup=delivery_dedup, max_body=WEBHOOK_MAX_BODY))
+webhook_app.router.add_get("/webhook/stats", handle_webhook_stats)
+webhook_app.router.add_get("/metrics", handle_metrics)
+
+metrics.gauge("webhook_queue_depth", "Push batches waiting in the delivery queue.").set_function(webhook_queue.queue.qsize)
+metrics.gauge("webhook_queue_latency_max_seconds", "Longest time a push batch spent between enqueue and delivery.").set_function(lambda: webhook_queue.latency_max)
+metrics.gauge("push_coalescer_pending_batches", "Push batches waiting for their debounce window.").set_function(lambda: len(push_coalescer.pending))
+rest_lane_depth = metrics.gauge("discord_rest_queue_depth", "Scheduled Discord REST calls waiting per lane.", ("lane",))
+for lane, lane_name in LANE_NAMES.items():
+    rest_lane_depth.labels(lane_name).set_function(lambda lane=lane: rest_scheduler.lane_depth[lane])
 
 async def start_webhook_server():
+    global webhook_runner, handoff_task
+    if webhook_runner is not None:
+        return
     port = int(os.environ.get("PORT", 5000))
-    runner = web.AppRunner(webhook_app)
-    await runner.setup()
-    site = web.TCPSite(runner, host='0.0.0.0', port=port)
+    webhook_queue.start()
+    if webhook_handoff is not None:
+        handoff_task = asyncio.create_task(webhook_handoff.consume(dispatch_event, poll_interval=WEBHOOK_HANDOFF_POLL))
+        print(f"📨 Consuming webhook handoff queue from {WEBHOOK_HANDOFF_PATH}")
+    webhook_runner = web.AppRunner(webhook_app)
+    await webhook_runner.setup()
+    site = web.TCPSite(webhook_runner, host='0.0.0.0', port=port)
     print(f"🚀 Starting Aiohttp Webhook Server on 0.0.0.0:{port}...")
     try:
         await site.start()
+        log_startup_phase("accepting webhooks")
     except Exception as e:
         print(f"FATAL: Failed to start web server on port {port}. Error: {e}")
 
+async def stop_webhook_server():
+    global webhook_runner, handoff_task
+    if webhook_runner is None:
+        return
+    # ปิดรับ HTTP และหยุดดึง handoff ก่อน แล้วค่อยรอให้คิวว่าง (ที่ยังไม่ได้ดึงจะค้างอยู่ใน handoff รอรอบหน้า)
+    await webhook_runner.cleanup()
+    webhook_runner = None
+    if handoff_task is not None:
+        handoff_task.cancel()
+        await asyncio.gather(handoff_task, return_exceptions=True)
+        handoff_task = None
+    # batch ที่ยังรอ debounce ต้องเข้าคิวก่อน แล้วค่อยรอให้คิวส่งหมด
+    await push_coalescer.flush_all(WEBHOOK_DRAIN_TIMEOUT)
+    await webhook_queue.drain(WEBHOOK_DRAIN_TIMEOUT)
+    await repo_stats.close()
+    delivery_dedup.close()
+    if webhook_handoff is not None:
+        webhook_handoff.close()
+    print(f"🛑 Webhook server stopped. Queue stats: {webhook_queue.stats()}")
+
 # --------------------------------------------------------------------------------
 ## Bot Events and Command Sync
 # --------------------------------------------------------------------------------
 @bot.event
 async def on_ready():
     print(f'🤖 Logged in as {bot.user} (ID: {bot.user.id})')
+    log_startup_phase("gateway ready")
+    # on_ready ถูกเรียกซ้ำทุกครั้งที่ reconnect จึง sync เฉพาะเมื่อคำสั่งเปลี่ยน
     try:
-        synced = await bot.tree.sync()
-        print(f"✨ Synced {len(synced)} global command(s).")
+        synced = await sync_if_changed(bot.tree, bot.application_id, COMMAND_SYNC_STATE_PATH)
+        if synced is None:
+            print("✨ Command tree unchanged, skipping sync.")
+        else:
+            print(f"✨ Synced {synced} global command(s).")
+            log_startup_phase("commands synced")
     except Exception as e:
         print(f"❌ Error syncing commands: {e}")
-    bot.loop.create_task(start_webhook_server())
+
+@bot.event
+async def on_raw_message_delete(payload):
+    message_cache.invalidate(payload.message_id)
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    for message_id in payload.message_ids:
+        message_cache.invalidate(message_id)
+
+@bot.event
+async def on_raw_message_edit(payload):
+    # ข้อความถูกแก้จากที่อื่น ให้ embed ใน cache ตรงกับของจริงเสมอ
+    if "embeds" in payload.data:
+        embeds = payload.data["embeds"]
+        if embeds:
+            message_cache.update_embed(payload.message_id, discord.Embed.from_dict(embeds[0]))
+        else:
+            message_cache.invalidate(payload.message_id)
 
 # --------------------------------------------------------------------------------
 ## Slash Command: /announce
 # --------------------------------------------------------------------------------
-def is_announcer(interaction: discord.Interaction) -> bool:
-    if interaction.guild and interaction.user.id == interaction.guild.owner_id:
+def is_announcer_member(guild, member) -> bool:
+    if guild is None or member is None:
+        return False
+    if member.id == guild.owner_id:
         return True
-    if ALLOWED_ANNOUNCER_ROLES and interaction.guild:
-        user_role_ids = [role.id for role in interaction.user.roles]
+    if ALLOWED_ANNOUNCER_ROLES and hasattr(member, "roles"):
+        user_role_ids = [role.id for role in member.roles]
         if any(role_id in user_role_ids for role_id in ALLOWED_ANNOUNCER_ROLES):
             return True
     return False
 
+def is_announcer(interaction: discord.Interaction) -> bool:
+    return is_announcer_member(interaction.guild, interaction.user)
+
+def build_announcement_embed(payload):
+    embed = discord.Embed(title=payload["title"], description=payload["description"], color=discord.Color.red())
+    embed.set_footer(text=f"ประกาศโดย: {payload['author_name']}", icon_url=payload.get("author_icon"))
+    if payload.get("image_url"):
+        embed.set_image(url=payload["image_url"])
+    return embed
+
+def parse_send_at(text):
+    # "YYYY-MM-DD HH:MM" เวลาไทย -> epoch, คืน None ถ้ารูปแบบผิด
+    try:
+        return datetime.datetime.strptime(text.strip(), "%Y-%m-%d %H:%M").replace(tzinfo=BKK_TIMEZONE).timestamp()
+    except ValueError:
+        return None
+
+async def check_announcement_targets(interaction, channel_ids):
+    # คืนรายการปัญหา: ผู้ประกาศต้องเป็น announcer ของทุก guild ปลายทาง และทั้งผู้ประกาศกับบอทต้องส่งข้อความในช่องนั้นได้
+    problems = []
+    members = {interaction.guild_id: interaction.user}
+    for channel_id in channel_ids:
+        channel = bot.get_channel(channel_id) or (interaction.guild.get_thread(channel_id) if interaction.guild else None)
+        if channel is None or getattr(channel, "guild", None) is None or not isinstance(channel, discord.abc.Messageable):
+            problems.append(f"<#{channel_id}>: ไม่พบช่อง")
+            continue
+        guild = channel.guild
+        if guild.id not in members:
+            try:
+                members[guild.id] = guild.get_member(interaction.user.id) or await guild.fetch_member(interaction.user.id)
+            except discord.HTTPException:
+                members[guild.id] = None
+        member = members[guild.id]
+        if not is_announcer_member(guild, member) or not channel.permissions_for(member).send_messages:
+            problems.append(f"<#{channel_id}>: คุณไม่มีสิทธิ์ประกาศในช่องนี้")
+            continue
+        bot_permissions = channel.permissions_for(guild.me)
+        if not (bot_permissions.send_messages and bot_permissions.embed_links):
+            problems.append(f"<#{channel_id}>: บอทไม่มีสิทธิ์ส่ง embed ในช่องนี้")
+    return problems
+
+async def deliver_announcement(announcement_id):
+    # ส่งไปทุกช่องที่ยัง pending พร้อมกันผ่าน rest_scheduler (จำกัดอัตราแยกต่อช่อง) แล้วบันทึกผลทีละช่องทันที
+    # ช่องที่ส่งแล้วจะไม่ถูกส่งซ้ำแม้บอทจะ restart ระหว่าง fan-out
+    await bot.wait_until_ready()
+    record = await announcement_store.get(announcement_id)
+    if record is None:
+        return None
+    announcement, targets = record
+    payload = announcement["payload"]
+    embed = build_announcement_embed(payload)
+    content = payload.get("content") or None
+
+    async def send_to(channel_id):
+        channel = bot.get_channel(channel_id) or bot.get_partial_messageable(channel_id)
+        try:
+            message = await rest_scheduler.submit(channel_id, lambda: channel.send(content=content, embed=embed))
+            result = (channel_id, TARGET_SENT, message.id, None)
+        except Exception as e:
+            result = (channel_id, TARGET_FAILED, None, str(e)[:200])
+        await announcement_store.record_results(announcement_id, [result])
+
+    pending = [target["channel_id"] for target in targets if target["status"] == TARGET_PENDING]
+    started = time.perf_counter()
+    await asyncio.gather(*(send_to(channel_id) for channel_id in pending))
+    announcement, targets = await announcement_store.get(announcement_id)
+    sent = sum(1 for target in targets if target["status"] == TARGET_SENT)
+    print(f"📢 Announcement #{announcement_id}: sent {sent}/{len(targets)} in {time.perf_counter() - started:.2f}s")
+    return targets
+
+def format_announcement_report(announcement_id, targets, limit=20):
+    icons = {TARGET_SENT: "✅", TARGET_FAILED: "❌", TARGET_PENDING: "⏳"}
+    sent = sum(1 for target in targets if target["status"] == TARGET_SENT)
+    lines = [f"ประกาศ #{announcement_id}: ส่งสำเร็จ {sent}/{len(targets)} ช่อง"]
+    for target in targets[:limit]:
+        line = f"{icons.get(target['status'], '?')} <#{target['channel_id']}>"
+        if target["error"]:
+            line += f" — {target['error']}"
+        lines.append(line)
+    if len(targets) > limit:
+        lines.append(f"... และอีก {len(targets) - limit} ช่อง")
+    return "\n".join(lines)[:2000]
+
 class AnnouncementModal(discord.ui.Modal, title='📝 สร้างข้อความประชาสัมพันธ์'):
     title_input = discord.ui.TextInput(label='หัวเรื่อง (Title)', placeholder='สรุป Live Session / อัปเดตแพตช์ใหม่', max_length=256, required=True)
     description_input = discord.ui.TextInput(label='เนื้อหา (รองรับ Markdown)', placeholder='กรอกเนื้อหารายละเอียดทั้งหมดที่นี่...', style=discord.TextStyle.paragraph, required=True)
-    image_url_input = discord.ui.TextInput(label='ลิงก์รูปภาพ (Image URL - ไม่บังคับ)', placeholder='ต้องเป็นลิงก์ที่ลงท้าย .png, .jpg, .gif, .webp', max_length=2000, required=False)
+    image_url_input = discord.ui.TextInput(label='ลิงก์รูปภาพ (Image URL - ไม่บังคับ)', placeholder='ลิงก์รูปภาพ http(s) (ตรวจชนิดไฟล์ให้อัตโนมัติ)', max_length=2000, required=False)
     mention_input = discord.ui.TextInput(label='แท็กใคร? (@everyone, @here หรือ Discord ID)', placeholder='ว่างไว้ = ไม่แท็กใคร', max_length=100, required=False)
 
-    async def on_submit(self, interaction: discord.Interaction):
-        title = self.title_input.value
-        description = self.description_input.value
-        image_url = self.image_url_input.value
-        mention_text = self.mention_input.value.strip()
+    def __init__(self, channel_ids, send_at=None):
+        super().__init__()
+        self.channel_ids = channel_ids
+        self.send_at = send_at
 
-        embed = discord.Embed(title=title, description=description, color=discord.Color.red())
-        embed.set_footer(text=f"ประกาศโดย: {interaction.user.display_name}", icon_url=interaction.user.display_avatar.url)
+    async def on_submit(self, interaction: discord.Interaction):
+        with COMMAND_SECONDS.labels("announce").time():
+            await self.post_announcement(interaction)
 
-        if image_url and image_url.startswith("http"):
-            parsed_url = urllib.parse.urlparse(image_url)
-            if parsed_url.path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                embed.set_image(url=image_url)
+    async def post_announcement(self, interaction: discord.Interaction):
+        image_url = self.image_url_input.value.strip()
+        mention_text = self.mention_input.value.strip()
 
         content = ""
         if mention_text.lower() == "@everyone":
@@ -178,17 +468,67 @@ class AnnouncementModal(discord.ui.Modal, title='📝 สร้างข้อ
             content = f"<@{mention_text}>"
 
         await interaction.response.send_message(content="<a:1249347622158860308:1422185419491246101> กำลังโพสต์ประชาสัมพันธ์...", ephemeral=True)
-        await interaction.followup.send(content=content, embed=embed)
-        await interaction.edit_original_response(content="<a:45696190630e4f208144d0582a0b0414:1423939335928938506> โพสต์ประชาสัมพันธ์สำเร็จแล้ว!")
+
+        problems = await check_announcement_targets(interaction, self.channel_ids)
+        if problems:
+            await interaction.edit_original_response(content="❌ ส่งประกาศไม่ได้:\n" + "\n".join(problems)[:1900])
+            return
+
+        # ตรวจรูปครั้งเดียวตอนสร้างประกาศ ไม่ใช่ทุกช่องที่ส่ง
+        notes = []
+        if image_url:
+            valid, reason = await validate_image_url(image_url)
+            if not valid:
+                notes.append(f"⚠️ ไม่ใส่รูปภาพ: {reason}")
+                image_url = ""
+
+        payload = {
+            "title": self.title_input.value,
+            "description": self.description_input.value,
+            "image_url": image_url or None,
+            "content": content,
+            "author_name": interaction.user.display_name,
+            "author_icon": interaction.user.display_avatar.url,
+        }
+        send_at = self.send_at or time.time()
+        announcement_id = await announcement_store.create(interaction.guild_id, interaction.user.id, send_at, payload, self.channel_ids)
+
+        if self.send_at:
+            announcement_scheduler.schedule(announcement_id, send_at)
+            when = datetime.datetime.fromtimestamp(send_at, BKK_TIMEZONE).strftime("%Y-%m-%d %H:%M")
+            notes.insert(0, f"🕒 ตั้งเวลาประกาศ #{announcement_id} ไปยัง {len(self.channel_ids)} ช่อง เวลา {when} (เวลาไทย)\nดูสถานะได้ด้วย /announce_status {announcement_id}")
+            await interaction.edit_original_response(content="\n".join(notes))
+            return
+
+        targets = await deliver_announcement(announcement_id)
+        report = format_announcement_report(announcement_id, targets)
+        await interaction.edit_original_response(content="\n".join(["<a:45696190630e4f208144d0582a0b0414:1423939335928938506> โพสต์ประชาสัมพันธ์เสร็จแล้ว!", *notes, report])[:2000])
 
 
     async def on_error(self, interaction: discord.Interaction, error: Exception) -> None:
         await interaction.followup.send(f'❌ เกิดข้อผิดพลาด: {error}', ephemeral=True)
 
 @bot.tree.command(name="announce", description="📢 สร้างข้อความประชาสัมพันธ์ (จำกัดสิทธิ์)")
+@app_commands.describe(channels="ช่องปลายทาง (mention หรือ ID คั่นด้วย comma) ว่างไว้ = ช่องนี้", send_at="ตั้งเวลาส่ง YYYY-MM-DD HH:MM (เวลาไทย) ว่างไว้ = ส่งทันที")
 @app_commands.check(is_announcer)
-async def announce_command(interaction: discord.Interaction):
-    await interaction.response.send_modal(AnnouncementModal())
+async def announce_command(interaction: discord.Interaction, channels: str = None, send_at: str = None):
+    channel_ids = parse_channel_ids(channels) if channels else [interaction.channel_id]
+    if not channel_ids:
+        await interaction.response.send_message("❌ ไม่พบช่องปลายทาง ใช้ #ช่อง หรือ ID คั่นด้วย comma", ephemeral=True)
+        return
+    if len(channel_ids) > ANNOUNCEMENT_MAX_TARGETS:
+        await interaction.response.send_message(f"❌ ส่งได้สูงสุด {ANNOUNCEMENT_MAX_TARGETS} ช่องต่อประกาศ", ephemeral=True)
+        return
+    send_at_ts = None
+    if send_at:
+        send_at_ts = parse_send_at(send_at)
+        if send_at_ts is None:
+            await interaction.response.send_message("❌ รูปแบบเวลาไม่ถูกต้อง ใช้ YYYY-MM-DD HH:MM (เวลาไทย)", ephemeral=True)
+            return
+        if send_at_ts <= time.time():
+            await interaction.response.send_message("❌ เวลาที่ตั้งต้องอยู่ในอนาคต", ephemeral=True)
+            return
+    await interaction.response.send_modal(AnnouncementModal(channel_ids, send_at_ts))
 
 @announce_command.error
 async def announce_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
@@ -198,86 +538,141 @@ async def announce_command_error(interaction: discord.Interaction, error: app_co
         print(f"Error in announce_command: {error}")
         await interaction.response.send_message("❌ เกิดข้อผิดพลาด.", ephemeral=True)
 
+@bot.tree.command(name="announce_status", description="📋 ดูสถานะการส่งประกาศรายช่อง (จำกัดสิทธิ์)")
+@app_commands.check(is_announcer)
+async def announce_status_command(interaction: discord.Interaction, announcement_id: int):
+    record = await announcement_store.get(announcement_id)
+    if record is None or record[0]["guild_id"] != interaction.guild_id:
+        await interaction.response.send_message(f"❌ ไม่พบประกาศ #{announcement_id}", ephemeral=True)
+        return
+    announcement, targets = record
+    when = datetime.datetime.fromtimestamp(announcement["send_at"], BKK_TIMEZONE).strftime("%Y-%m-%d %H:%M")
+    header = f"**{announcement['payload']['title'][:200]}** (กำหนดส่ง {when})"
+    await interaction.response.send_message(f"{header}\n{format_announcement_report(announcement_id, targets)}"[:2000], ephemeral=True)
+
+@announce_status_command.error
+async def announce_status_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.CheckFailure):
+        await interaction.response.send_message("❌ คุณไม่มีสิทธิ์ใช้คำสั่งนี้.", ephemeral=True)
+    else:
+        print(f"Error in announce_status_command: {error}")
+        await interaction.response.send_message("❌ เกิดข้อผิดพลาด.", ephemeral=True)
+
 # --------------------------------------------------------------------------------
 ## Slash Command: /session
 # --------------------------------------------------------------------------------
+async def mark_session_message_finished(channel_id, message_id):
+    cached = message_cache.get(message_id)
+    if cached is not None:
+        # มีใน cache แล้ว แก้ได้ทันทีด้วย REST call เดียว
+        old_message = cached.message
+        old_embed = cached.embed.copy()
+    else:
+        old_message = await bot.get_partial_messageable(channel_id).fetch_message(message_id)
+        old_embed = old_message.embeds[0]
+    old_embed.title = "<a:45696190630e4f208144d0582a0b0414:1423939335928938506> ทำงานเป็นทีมสิ้นสุด (Finished)"
+    old_embed.description = "การทำงานเป็นทีม นี้สิ้นสุดแล้ว ดูสรุปด้านล่าง"
+    try:
+        await old_message.edit(embed=old_embed, view=None)
+    finally:
+        message_cache.invalidate(message_id)
+
 class SessionAction(discord.app_commands.Choice):
     def __init__(self, name: str, value: str):
         super().__init__(name=name, value=value)
 
 @bot.tree.command(name="session", description="▶️ จัดการ Live Share Session ในช่องทำงานเป็นทีม")
-@app_commands.describe(action="เลือกคำสั่ง: start, status หรือ end", link="ลิงก์ Live Share (ใช้เฉพาะกับ action: start)")
+@app_commands.describe(action="เลือกคำสั่ง: start, status, end หรือ stats", link="ลิงก์ Live Share (ใช้เฉพาะกับ action: start)", name="ชื่อ Session (ไม่ใส่ = main) ใช้แยกหลายทีมในช่องเดียวกัน")
 @app_commands.choices(action=[
     SessionAction(name="▶️ เริ่มทำงานเป็นทีม", value="start"),
     SessionAction(name="ℹ️ แสดงสถานะทีม ปัจจุบัน", value="status"),
-    SessionAction(name="⏹️ ปิดการทำงานเป็นทีม และคำนวณเวลา", value="end")
+    SessionAction(name="⏹️ ปิดการทำงานเป็นทีม และคำนวณเวลา", value="end"),
+    SessionAction(name="📊 สถิติการทำงานเป็นทีม", value="stats")
 ])
-async def session_command(interaction: discord.Interaction, action: str, link: str = None):
+async def session_command(interaction: discord.Interaction, action: str, link: str = None, name: str = None):
+    with COMMAND_SECONDS.labels("session").time():
+        await handle_session_command(interaction, action, link, name)
+
+async def handle_session_command(interaction: discord.Interaction, action: str, link: str = None, name: str = None):
     user_name = interaction.user.display_name
-    if interaction.channel_id != DASHBOARD_CHANNEL_ID:
+    if SESSION_CHANNEL_IDS and interaction.channel_id not in SESSION_CHANNEL_IDS:
         await interaction.response.send_message("❌ คำสั่งนี้ใช้ได้เฉพาะช่อง #live-share-dashboard เท่านั้น", ephemeral=True)
         return
+    guild_id = interaction.guild_id or 0
+    channel_id = interaction.channel_id
+    session_id = (name or DEFAULT_SESSION_ID).strip()[:50] or DEFAULT_SESSION_ID
     if action == "start":
         if not link:
             await interaction.response.send_message("❌ โปรดใส่ลิงก์ Live Share", ephemeral=True)
             return
-        session_data["link"] = link
-        session_data["participants"] = [user_name]
-        session_data["start_time"] = get_bkk_time()
-        session_data["end_time"] = None
-        session_data["last_message_id"] = None
-        with open("session.json", "w") as f:
-            json.dump(session_data, f)
-        ephemeral_message = f"<a:45696190630e4f208144d0582a0b0414:1423939335928938506> **ทำงานเป็นทีม เริ่มต้นแล้ว!**\nโฮสต์: {user_name}"
-        await interaction.response.send_message(ephemeral_message, ephemeral=True)
-        embed = discord.Embed(title="<a:67c3e29969174247b000f7c7318660f:1423939328928780338> ทำงานเป็นทีมเริ่มแล้ว <a:67c3e29969174247b000f7c7318660f:1423939328928780338>", description="ทำงานเป็นทีม เริ่มขึ้นแล้ว! กดปุ่มเพื่อเข้าร่วม", color=0x3498db)
-        embed.add_field(name="ผู้เริ่ม ", value=user_name, inline=True)
-        embed.add_field(name="เวลาเริ่ม", value=session_data["start_time"], inline=True)
-        embed.add_field(name="ผู้เข้าร่วมปัจจุบัน", value=", ".join(session_data["participants"]), inline=False)
-        view = discord.ui.View()
-        view.add_item(discord.ui.Button(label="🖱️: ̗̀➛ เข้าร่วม Session (LIVE)", url=link, style=discord.ButtonStyle.green))
-        sent_message = await interaction.followup.send(embed=embed, view=view, wait=True)
-        session_data["last_message_id"] = sent_message.id
-        with open("session.json", "w") as f:
-            json.dump(session_data, f)
+        async with session_engine.locked(guild_id, channel_id, session_id):
+            if session_engine.get(guild_id, channel_id, session_id):
+                await interaction.response.send_message(f"❌ Session `{session_id}` กำลังทำงานอยู่แล้ว ปิดก่อนหรือใช้ชื่ออื่น", ephemeral=True)
+                return
+            session = session_engine.start(guild_id, channel_id, session_id, host=user_name, link=link, participants=[user_name], participant_ids=[interaction.user.id], start_time=get_bkk_time(), start_ts=time.time(), end_time=None, last_message_id=None)
+            ephemeral_message = f"<a:45696190630e4f208144d0582a0b0414:1423939335928938506> **ทำงานเป็นทีม เริ่มต้นแล้ว!**\nโฮสต์: {user_name}\nSession: `{session_id}`"
+            await interaction.response.send_message(ephemeral_message, ephemeral=True)
+            embed = discord.Embed(title="<a:67c3e29969174247b000f7c7318660f:1423939328928780338> ทำงานเป็นทีมเริ่มแล้ว <a:67c3e29969174247b000f7c7318660f:1423939328928780338>", description="ทำงานเป็นทีม เริ่มขึ้นแล้ว! กดปุ่มเพื่อเข้าร่วม", color=0x3498db)
+            embed.add_field(name="ผู้เริ่ม ", value=user_name, inline=True)
+            embed.add_field(name="เวลาเริ่ม", value=session["start_time"], inline=True)
+            if session_id != DEFAULT_SESSION_ID:
+                embed.add_field(name="Session", value=session_id, inline=True)
+            embed.add_field(name="ผู้เข้าร่วมปัจจุบัน", value=", ".join(session["participants"]), inline=False)
+            view = discord.ui.View()
+            view.add_item(discord.ui.Button(label="🖱️: ̗̀➛ เข้าร่วม Session (LIVE)", url=link, style=discord.ButtonStyle.green))
+            sent_message = await interaction.followup.send(embed=embed, view=view, wait=True)
+            # เก็บเป็น PartialMessage ของช่อง (ใช้ bot token) เพราะ token ของ followup หมดอายุใน 15 นาที
+            message_cache.put(sent_message.id, bot.get_partial_messageable(channel_id).get_partial_message(sent_message.id), embed)
+            session_engine.update(session, last_message_id=sent_message.id)
     elif action == "status":
-        if not session_data.get("link"):
-            await interaction.response.send_message("❌ ไม่มี การทำงานเป็นทีม ที่กำลังทำงานอยู่", ephemeral=True)
+        session = session_engine.get(guild_id, channel_id, session_id)
+        if not session:
+            others = session_engine.list_channel(guild_id, channel_id)
+            hint = f"\nSession ที่กำลังทำงานในช่องนี้: {', '.join(others)}" if others else ""
+            await interaction.response.send_message(f"❌ ไม่มี การทำงานเป็นทีม ที่กำลังทำงานอยู่{hint}", ephemeral=True)
             return
-        embed = discord.Embed(title="<a:1249347622158860308:1422185419491246101> สถานะ Live Share Session ปัจจุบัน", description=f"<a:2a3404eb19f54b10b16e83768f5937ae:1423939322947829841> ทำงานเป็นทีม กำลังทำงานอยู่ (จัดการโดย {user_name})", color=0xf39c12)
-        embed.add_field(name="เวลาเริ่ม", value=session_data.get("start_time","-"), inline=True)
-        embed.add_field(name="ผู้เข้าร่วม", value=", ".join(session_data.get("participants",[])) or "(ยังไม่มี)", inline=False)
+        embed = discord.Embed(title="<a:1249347622158860308:1422185419491246101> สถานะ Live Share Session ปัจจุบัน", description=f"<a:2a3404eb19f54b10b16e83768f5937ae:1423939322947829841> ทำงานเป็นทีม กำลังทำงานอยู่ (จัดการโดย {session.get('host') or user_name})", color=0xf39c12)
+        embed.add_field(name="เวลาเริ่ม", value=session.get("start_time") or "-", inline=True)
+        embed.add_field(name="Session", value=session_id, inline=True)
+        embed.add_field(name="ผู้เข้าร่วม", value=", ".join(session.get("participants",[])) or "(ยังไม่มี)", inline=False)
         view = discord.ui.View()
-        view.add_item(discord.ui.Button(label="🔗 ลิงก์ทำงานเป็นทีม ปัจจุบัน", url=session_data.get('link','-'), style=discord.ButtonStyle.green))
+        view.add_item(discord.ui.Button(label="🔗 ลิงก์ทำงานเป็นทีม ปัจจุบัน", url=session["link"], style=discord.ButtonStyle.green))
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
     elif action == "end":
-        if not session_data.get("link"):
+        async with session_engine.locked(guild_id, channel_id, session_id):
+            session = session_engine.get(guild_id, channel_id, session_id)
+            if session:
+                session_engine.end(guild_id, channel_id, session_id)
+        if not session:
             await interaction.response.send_message("❌ ไม่มี การทำงานเป็นทีม ที่จะให้ปิด", ephemeral=True)
             return
-        end_time_str = get_bkk_time()
-        current_link = session_data.get("link")
-        current_message_id = session_data.get("last_message_id")
-        current_participants = session_data.get("participants", [])
-        current_start_time = session_data.get("start_time", "-")
+        end_dt = get_bkk_now()
+        end_time_str = end_dt.strftime("%Y-%m-%d %H:%M:%S")
+        current_link = session["link"]
+        current_message_id = session.get("last_message_id")
+        current_participants = session.get("participants", [])
+        # สถิติผูกกับ user id, session รุ่นเก่าที่ไม่มี id จะนับตามชื่อแทน
+        participant_ids = session.get("participant_ids") or [None] * len(current_participants)
+        current_start_time = session.get("start_time") or "-"
         duration_text = "-"
+        start_dt = None
         try:
-            bkk_tz = pytz.timezone('Asia/Bangkok')
-            start_dt = bkk_tz.localize(datetime.datetime.strptime(current_start_time, "%Y-%m-%d %H:%M:%S"))
-            end_dt = bkk_tz.localize(datetime.datetime.strptime(end_time_str, "%Y-%m-%d %H:%M:%S"))
+            start_dt = get_session_start(session)
             delta = end_dt - start_dt
             if delta.total_seconds() < 0:
                 duration_text = "❌ เวลาเริ่ม/จบ ไม่ถูกต้อง"
+                start_dt = None
             else:
-                hours = int(delta.total_seconds() // 3600)
-                minutes = int((delta.total_seconds() % 3600) // 60)
-                duration_text = f"{hours} ชั่วโมง {minutes} นาที"
+                duration_text = format_duration(delta.total_seconds())
         except Exception as e:
             print(f"Error calculating duration: {e}")
-        session_data.clear()
-        with open("session.json", "w") as f:
-            json.dump(session_data, f)
         ephemeral_message = f"<a:45696190630e4f208144d0582a0b0414:1423939335928938506> **ทำงานเป็นทีม ถูกปิดแล้ว!**\nผู้ปิด Session: {user_name}"
         await interaction.response.send_message(ephemeral_message, ephemeral=True)
+        if start_dt is not None:
+            try:
+                await session_history.record(guild_id, channel_id, session_id, session.get("host"), current_link, list(zip(participant_ids, current_participants)), start_dt, end_dt)
+            except Exception as e:
+                print(f"Error archiving session {session_id}: {e}")
         embed = discord.Embed(title="<a:810020134865338368:1423938901671804968> การทำงานเป็นทีมสิ้นสุด", description="การทำงานเป็นทีม สิ้นสุดลงแล้ว", color=0xe74c3c)
         embed.add_field(name="เวลาเริ่ม", value=current_start_time, inline=True)
         embed.add_field(name="เวลาสิ้นสุด", value=end_time_str, inline=True)
@@ -288,17 +683,35 @@ async def session_command(interaction: discord.Interaction, action: str, link: s
         await interaction.followup.send(embed=embed, view=view)
         if current_message_id:
             try:
-                channel_obj = bot.get_channel(DASHBOARD_CHANNEL_ID)
-                if channel_obj:
-                    old_message = await channel_obj.fetch_message(current_message_id)
-                    old_embed = old_message.embeds[0]
-                    old_embed.title = "<a:45696190630e4f208144d0582a0b0414:1423939335928938506> ทำงานเป็นทีมสิ้นสุด (Finished)"
-                    old_embed.description = "การทำงานเป็นทีม นี้สิ้นสุดแล้ว ดูสรุปด้านล่าง"
-                    await old_message.edit(embed=old_embed, view=None)
+                await rest_scheduler.submit(channel_id, lambda: mark_session_message_finished(channel_id, current_message_id), PRIORITY_HIGH)
             except discord.NotFound:
                 print(f"Warning: Original START message with ID {current_message_id} not found.")
+    elif action == "stats":
+        stats = await session_history.stats(guild_id, interaction.user.id)
+        embed = discord.Embed(title="📊 สถิติการทำงานเป็นทีม", color=0x9b59b6)
+        top_lines = [f"{i}. {name} — {format_duration(seconds)} ({count} ครั้ง)" for i, (name, count, seconds) in enumerate(stats["top_users"], 1)]
+        embed.add_field(name="ผู้ใช้เวลามากที่สุด", value="\n".join(top_lines) or "(ยังไม่มีข้อมูล)", inline=False)
+        week_lines = [f"{format_week(week)} — {format_duration(seconds)} ({count} ครั้ง)" for week, count, seconds in stats["weekly"]]
+        embed.add_field(name="รายสัปดาห์", value="\n".join(week_lines) or "(ยังไม่มีข้อมูล)", inline=False)
+        if stats["user"]:
+            count, seconds = stats["user"]
+            user_weeks = ", ".join(f"{format_week(week)}: {format_duration(total)}" for week, _, total in stats["user_weekly"])
+            embed.add_field(name=f"ของคุณ ({user_name})", value=f"{format_duration(seconds)} ({count} ครั้ง)" + (f"\n{user_weeks}" if user_weeks else ""), inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # --------------------------------------------------------------------------------
 ## Run Bot
 # --------------------------------------------------------------------------------
-bot.run(TOKEN)
+async def main():
+    # เปิดรับ webhook ทันทีโดยไม่รอ gateway, event ที่เข้ามาก่อนจะรอในคิวจนบอท ready (wait_until_ready)
+    log_startup_phase("modules and state loaded")
+    async with bot:
+        await start_webhook_server()
+        await bot.start(TOKEN)
+
+if __name__ == "__main__":
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,33 @@
+import asyncio
+import hashlib
+import json
+
+import discord
+
+from json_store import load_json, write_json_atomic
+
+# --------------------------------------------------------------------------------
+## Cached Command Tree Sync
+# --------------------------------------------------------------------------------
+# tree.sync() เป็น request ที่ช้าและโดน rate limit แรง แต่ on_ready ถูกเรียกทุกครั้งที่ reconnect
+# จึงเก็บ hash ของ payload คำสั่งทั้งหมดไว้ และ sync เฉพาะเมื่อคำสั่งเปลี่ยนหรือเปลี่ยน application
+
+COMMAND_TYPES = (discord.AppCommandType.chat_input, discord.AppCommandType.user, discord.AppCommandType.message)
+
+
+def command_tree_hash(tree):
+    payload = []
+    for command_type in COMMAND_TYPES:
+        payload.extend(command.to_dict(tree) for command in tree.get_commands(type=command_type))
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+async def sync_if_changed(tree, application_id, path):
+    # คืนจำนวนคำสั่งที่ sync ไป หรือ None ถ้าไม่มีอะไรเปลี่ยน
+    digest = command_tree_hash(tree)
+    state = await asyncio.to_thread(load_json, path, {})
+    if state.get("hash") == digest and state.get("application_id") == application_id:
+        return None
+    synced = await tree.sync()
+    await asyncio.to_thread(write_json_atomic, path, {"hash": digest, "application_id": application_id})
+    return len(synced)
@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --------------------------------------------------------------------------------
+## Webhook Delivery Deduplication (X-GitHub-Delivery)
+# --------------------------------------------------------------------------------
+# GitHub ส่งซ้ำได้ (retry / redeliver) จึงจำ delivery id ที่รับแล้วไว้ตาม TTL
+# ชั้นแรกเป็น OrderedDict ในหน่วยความจำ ชั้นที่สองเป็น SQLite ที่อยู่รอดข้ามการ restart
+# และใช้ร่วมกันได้ระหว่าง ingest หลาย process (INSERT OR IGNORE เป็น atomic)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    delivery_id TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_seen_at ON deliveries (seen_at);
+"""
+
+PRUNE_EVERY = 1000
+
+
+class DeliveryDedup:
+    def __init__(self, path=None, ttl=24 * 3600, maxsize=50000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.recent = OrderedDict()
+        self.duplicates = 0
+        self.inserts = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def _remember(self, delivery_id, now):
+        self.recent[delivery_id] = now + self.ttl
+        self.recent.move_to_end(delivery_id)
+        while len(self.recent) > self.maxsize:
+            self.recent.popitem(last=False)
+
+    def _seen_in_memory(self, delivery_id, now):
+        expires_at = self.recent.get(delivery_id)
+        if expires_at is None:
+            return False
+        if expires_at < now:
+            del self.recent[delivery_id]
+            return False
+        return True
+
+    def _claim_on_disk(self, delivery_id, now):
+        with self.lock:
+            self.conn.execute("DELETE FROM deliveries WHERE delivery_id = ? AND seen_at < ?", (delivery_id, now - self.ttl))
+            cursor = self.conn.execute("INSERT OR IGNORE INTO deliveries (delivery_id, seen_at) VALUES (?, ?)", (delivery_id, now))
+            self.inserts += 1
+            if self.inserts % PRUNE_EVERY == 0:
+                self.conn.execute("DELETE FROM deliveries WHERE seen_at < ?", (now - self.ttl,))
+            return cursor.rowcount == 1
+
+    def _release_on_disk(self, delivery_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM deliveries WHERE delivery_id = ?", (delivery_id,))
+
+    async def claim(self, delivery_id):
+        # True = delivery ใหม่ ให้ประมวลผลต่อ, False = เคยรับไปแล้ว
+        if not delivery_id:
+            return True
+        now = time.time()
+        if self._seen_in_memory(delivery_id, now):
+            self.duplicates += 1
+            return False
+        # จองในหน่วยความจำก่อน กัน request ซ้ำที่เข้ามาพร้อมกันระหว่างรอดิสก์
+        self._remember(delivery_id, now)
+        if self.conn is not None and not await asyncio.to_thread(self._claim_on_disk, delivery_id, now):
+            self.duplicates += 1
+            return False
+        return True
+
+    async def release(self, delivery_id):
+        # ใช้เมื่อรับ delivery แล้วแต่ประมวลผลไม่ได้ (เช่นคิวเต็ม) เพื่อให้ GitHub ส่งซ้ำแล้วผ่านได้
+        if not delivery_id:
+            return
+        self.recent.pop(delivery_id, None)
+        if self.conn is not None:
+            await asyncio.to_thread(self._release_on_disk, delivery_id)
+
+    def stats(self):
+        return {"recent": len(self.recent), "duplicates": self.duplicates}
+
+    def close(self):
+        if self.conn is not None:
+            with self.lock:
+                self.conn.close()
@@ -1,72 +1,76 @@
 from aiohttp import web
-import hmac
-import hashlib
-import json
+import multiprocessing
 import os
-import asyncio
-import discord
+import signal
+from dotenv import load_dotenv
+from handoff import HandoffQueue
+from delivery_dedup import DeliveryDedup
+from webhook_ingest import make_webhook_handler, handle_metrics
 
-DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-DASHBOARD_CHANNEL_ID = int(os.getenv("DASHBOARD_CHANNEL_ID"))
-GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
-
-intents = discord.Intents.default()
-bot = discord.Client(intents=intents)
-
-# โหลด session info
-try:
-    with open("session.json", "r") as f:
-        session_data = json.load(f)
-except FileNotFoundError:
-    session_data = {}
-
-# -------- Helper --------
-def verify_signature(request_body, signature):
-    mac = hmac.new(GITHUB_WEBHOOK_SECRET.encode(), msg=request_body, digestmod=hashlib.sha256)
-    expected = "sha256=" + mac.hexdigest()
-    return hmac.compare_digest(expected, signature)
+# --------------------------------------------------------------------------------
+## Standalone GitHub Webhook Ingest Service
+# --------------------------------------------------------------------------------
+# รับ webhook ได้หลาย process พร้อมกัน (SO_REUSEPORT) แล้วส่ง event ที่ verify/normalise แล้ว
+# ต่อให้ process ของบอทผ่าน handoff queue (SQLite) ตัวบอทต้องตั้ง WEBHOOK_HANDOFF_PATH เป็นไฟล์เดียวกัน
+#
+#   WEBHOOK_PROCESSES=4 python github_webhook.py
 
-async def update_github_embed(payload):
-    await bot.wait_until_ready()
-    channel = bot.get_channel(DASHBOARD_CHANNEL_ID)
-    embed = discord.Embed(title="📦 GitHub Repo Status", color=0x3498db)
+# โหลด Environment Variables
+load_dotenv()
 
-    repo_name = payload["repository"]["name"]
-    branch = payload["ref"].split("/")[-1]
-    last_commit = payload["head_commit"]["message"]
-    author = payload["head_commit"]["author"]["name"]
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+WEBHOOK_INGEST_PORT = int(os.getenv("WEBHOOK_INGEST_PORT", 5001))
+WEBHOOK_PROCESSES = int(os.getenv("WEBHOOK_PROCESSES", os.cpu_count() or 1))
+WEBHOOK_HANDOFF_PATH = os.getenv("WEBHOOK_HANDOFF_PATH", "webhook_handoff.db")
+WEBHOOK_HANDOFF_MAX = int(os.getenv("WEBHOOK_HANDOFF_MAX", 10000))
+WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", 10))
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", 5 * 1024 * 1024))
+WEBHOOK_DEDUP_PATH = os.getenv("WEBHOOK_DEDUP_PATH", "webhook_deliveries.db")
+WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", 24 * 3600))
 
-    embed.add_field(name="Repo", value=repo_name, inline=False)
-    embed.add_field(name="Branch", value=branch, inline=True)
-    embed.add_field(name="Last commit", value=f"📝 {last_commit} by {author}", inline=True)
-    embed.add_field(name="PRs open", value="🔄 2", inline=True)      # placeholder
-    embed.add_field(name="Issues open", value="⚠️ 3", inline=True)   # placeholder
+def create_app():
+    handoff = HandoffQueue(WEBHOOK_HANDOFF_PATH, maxsize=WEBHOOK_HANDOFF_MAX)
+    dedup = DeliveryDedup(WEBHOOK_DEDUP_PATH, ttl=WEBHOOK_DEDUP_TTL)
 
-    # ปุ่มลิงก์สวย ๆ
-    view = discord.ui.View()
-    view.add_item(discord.ui.Button(label="กดตรงนี้", url=payload["repository"]["html_url"], style=discord.ButtonStyle.link))
-    await channel.send(embed=embed, view=view)
+    async def close_handoff(app):
+        handoff.close()
+        dedup.close()
 
-# -------- Aiohttp server สำหรับ GitHub webhook --------
-async def handle(request):
-    body = await request.read()
-    signature = request.headers.get("X-Hub-Signature-256")
-    if not verify_signature(body, signature):
-        return web.Response(status=401, text="Invalid signature")
+    app = web.Application()
+    app.router.add_post("/webhook", make_webhook_handler(GITHUB_WEBHOOK_SECRET, handoff.put_async, retry_after=WEBHOOK_RETRY_AFTER, dedup=dedup, max_body=WEBHOOK_MAX_BODY))
+    # แต่ละ process มี /metrics ของตัวเอง
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_cleanup.append(close_handoff)
+    return app
 
-    event = request.headers.get("X-GitHub-Event")
-    payload = json.loads(body)
+def run_worker(reuse_port):
+    print(f"🚀 Webhook ingest worker {os.getpid()} listening on 0.0.0.0:{WEBHOOK_INGEST_PORT}")
+    web.run_app(create_app(), host="0.0.0.0", port=WEBHOOK_INGEST_PORT, reuse_port=reuse_port, print=None)
 
-    if event == "push":
-        asyncio.create_task(update_github_embed(payload))
+def run_webhook_server():
+    if not GITHUB_WEBHOOK_SECRET:
+        print("ERROR: GITHUB_WEBHOOK_SECRET is not set.")
+        return
+    # สร้างตาราง handoff/dedup ก่อน fork จะได้ไม่แย่งกันสร้าง
+    HandoffQueue(WEBHOOK_HANDOFF_PATH).close()
+    DeliveryDedup(WEBHOOK_DEDUP_PATH).close()
+    if WEBHOOK_PROCESSES <= 1:
+        run_worker(reuse_port=False)
+        return
 
-    return web.Response(text="OK")
+    workers = [multiprocessing.Process(target=run_worker, args=(True,)) for _ in range(WEBHOOK_PROCESSES)]
+    for worker in workers:
+        worker.start()
 
-app = web.Application()
-app.router.add_post("/webhook", handle)
+    def stop_workers(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
 
-def run_webhook_server():
-    web.run_app(app, port=5000)
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    for worker in workers:
+        worker.join()
 
 if __name__ == "__main__":
     run_webhook_server()
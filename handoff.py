@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+# --------------------------------------------------------------------------------
+## Local Handoff Queue (SQLite)
+# --------------------------------------------------------------------------------
+# ทางส่ง event จาก ingest worker หลาย process ไปยัง process ของบอท (gateway) ที่มีตัวเดียว
+# ใช้ SQLite WAL บนดิสก์เครื่องเดียวกัน: ฝั่ง ingest INSERT, ฝั่งบอท poll แล้วลบแถวที่รับไปแล้ว
+# event ที่บอทยังรับไม่ได้ (คิวในบอทเต็ม) จะค้างอยู่ในตารางจนกว่าจะรับได้ ไม่หาย
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS handoff_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    body TEXT NOT NULL
+);
+"""
+
+
+class HandoffQueue:
+    def __init__(self, path, maxsize=10000):
+        self.path = path
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.delivered = 0
+        self.errors = 0
+        self.attempts = {}
+
+    def put(self, event):
+        body = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.maxsize and self.conn.execute("SELECT COUNT(*) FROM handoff_events").fetchone()[0] >= self.maxsize:
+                    self.conn.execute("ROLLBACK")
+                    return False
+                self.conn.execute("INSERT INTO handoff_events (created_at, body) VALUES (?, ?)", (time.time(), body))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return True
+
+    async def put_async(self, event):
+        return await asyncio.to_thread(self.put, event)
+
+    def _fetch(self, limit):
+        with self.lock:
+            return self.conn.execute("SELECT id, body FROM handoff_events ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def _delete(self, ids):
+        with self.lock:
+            self.conn.executemany("DELETE FROM handoff_events WHERE id = ?", [(i,) for i in ids])
+
+    def depth(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM handoff_events").fetchone()[0]
+
+    async def consume(self, dispatch, poll_interval=0.2, batch=100, max_backoff=30.0, max_attempts=5):
+        # มี consumer ได้ตัวเดียว (process ของบอท) จึงไม่ต้อง claim แถวแบบ atomic
+        # error ใด ๆ (SQLite lock, dispatch พัง) ห้ามทำให้ loop ตาย: log แล้วเว้นช่วงเพิ่มขึ้นเรื่อย ๆ ก่อนลองใหม่
+        backoff = poll_interval
+        while True:
+            try:
+                idle = await self._consume_once(dispatch, batch, max_attempts)
+                backoff = poll_interval
+                if idle:
+                    await asyncio.sleep(poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Handoff consumer error: {e!r}. Retrying in {backoff:.1f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(max_backoff, backoff * 2)
+
+    async def _consume_once(self, dispatch, batch, max_attempts):
+        # คืน True ถ้าไม่มีงาน หรือปลายทางรับต่อไม่ได้ (ให้รอรอบหน้า)
+        rows = await asyncio.to_thread(self._fetch, batch)
+        accepted = []
+        blocked = False
+        try:
+            for row_id, body in rows:
+                try:
+                    event = json.loads(body)
+                except json.JSONDecodeError:
+                    print(f"Dropping malformed handoff event {row_id}.")
+                    accepted.append(row_id)
+                    continue
+                try:
+                    ok = await dispatch(event)
+                except Exception as e:
+                    # event ที่ dispatch พังซ้ำ ๆ ทิ้งหลังครบจำนวนครั้ง ไม่ให้ขวางคิวทั้งหมด
+                    attempts = self.attempts.get(row_id, 0) + 1
+                    if attempts >= max_attempts:
+                        print(f"Dropping handoff event {row_id} after {attempts} failed dispatches: {e!r}")
+                        self.attempts.pop(row_id, None)
+                        accepted.append(row_id)
+                        continue
+                    self.attempts[row_id] = attempts
+                    raise
+                if not ok:
+                    blocked = True
+                    break
+                self.attempts.pop(row_id, None)
+                accepted.append(row_id)
+        finally:
+            if accepted:
+                await asyncio.to_thread(self._delete, accepted)
+                self.delivered += len(accepted)
+        return blocked or not rows
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
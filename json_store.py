@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+
+# --------------------------------------------------------------------------------
+## Atomic JSON Storage Helpers
+# --------------------------------------------------------------------------------
+
+def load_json(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        # เก็บไฟล์เสียไว้ก่อน ไม่งั้นการบันทึกครั้งถัดไปจะเขียนทับข้อมูลเดิมไปเลย
+        backup = f"{path}.invalid"
+        print(f"WARNING: {path} is corrupted ({e}), copied to {backup} and starting from defaults.")
+        shutil.copyfile(path, backup)
+        return default
+
+def write_text_atomic(path, text):
+    # เขียนลงไฟล์ชั่วคราวในโฟลเดอร์เดียวกันแล้ว rename ทับ ไฟล์จริงจะไม่มีวันถูกเขียนค้างครึ่ง ๆ
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def write_json_atomic(path, data):
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+class WriteBehindJSON:
+    # รวมการบันทึกหลายครั้งภายใน delay ให้เหลือการเขียนไฟล์ครั้งเดียว และเขียนใน thread แยกจาก event loop
+    def __init__(self, path, snapshot, delay=1.0):
+        self.path = path
+        self.snapshot = snapshot
+        self.delay = delay
+        self.dirty = False
+        self.timer = None
+        self.lock = asyncio.Lock()
+        self.writes = 0
+
+    def mark_dirty(self):
+        self.dirty = True
+        if self.timer is None or self.timer.done():
+            self.timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        # shield ไว้ เพื่อให้ close() ที่ cancel timer ไม่ตัดการเขียนที่กำลังทำอยู่กลางทาง
+        await asyncio.shield(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            # serialize บน loop เพื่อให้ได้ snapshot ที่ไม่ถูกแก้ระหว่างเขียน ส่วนการเขียนดิสก์ทำใน thread
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+            try:
+                await asyncio.to_thread(write_text_atomic, self.path, text)
+                self.writes += 1
+            except OSError as e:
+                self.dirty = True
+                print(f"ERROR: Failed to write {self.path}: {e}")
+
+    async def close(self):
+        if self.timer is not None and not self.timer.done():
+            self.timer.cancel()
+            await asyncio.gather(self.timer, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+# --------------------------------------------------------------------------------
+## Dashboard Message Cache (LRU)
+# --------------------------------------------------------------------------------
+# เก็บ PartialMessage + embed ล่าสุดของข้อความที่บอทส่งเอง เพื่อแก้ไขได้ด้วย REST call เดียว
+# โดยไม่ต้อง fetch_message ก่อน, ถูกล้างเมื่อข้อความถูกลบ และอัปเดต embed เมื่อข้อความถูกแก้
+
+
+class CachedMessage:
+    def __init__(self, message, embed):
+        self.message = message
+        self.embed = embed
+
+
+class MessageCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, message_id, message, embed):
+        self.entries[message_id] = CachedMessage(message, embed)
+        self.entries.move_to_end(message_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, message_id):
+        entry = self.entries.get(message_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(message_id)
+        self.hits += 1
+        return entry
+
+    def update_embed(self, message_id, embed):
+        entry = self.entries.get(message_id)
+        if entry is not None:
+            entry.embed = embed
+
+    def invalidate(self, message_id):
+        return self.entries.pop(message_id, None) is not None
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "capacity": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+# --------------------------------------------------------------------------------
+## Push Event Coalescing
+# --------------------------------------------------------------------------------
+# รวม push ที่เข้ามาติด ๆ กันใน repo/branch เดียวกันให้เหลือ embed เดียว
+# key = (repository full_name, branch), รอจนไม่มี push ใหม่ภายใน window แล้วค่อย flush
+
+MAX_AUTHORS = 10
+
+
+class PushBatch:
+    def __init__(self, full_name, repo_name, branch, html_url):
+        self.full_name = full_name
+        self.repo_name = repo_name
+        self.branch = branch
+        self.html_url = html_url
+        self.pushes = 0
+        self.commit_count = 0
+        self.authors = []
+        self.head_message = None
+        self.head_author = None
+        self.head_url = None
+        self.before = None
+        self.after = None
+        self.compare_url = None
+        self.created_at = time.monotonic()
+        self.updated_at = self.created_at
+
+    def add(self, payload):
+        commits = payload.get("commits") or []
+        self.pushes += 1
+        self.commit_count += len(commits)
+        self.updated_at = time.monotonic()
+        for commit in commits:
+            name = (commit.get("author") or {}).get("name")
+            if name and name not in self.authors:
+                self.authors.append(name)
+
+        head = payload.get("head_commit") or (commits[-1] if commits else None)
+        if head:
+            self.head_message = head.get("message", "")
+            self.head_author = (head.get("author") or {}).get("name")
+            self.head_url = head.get("url")
+            if self.head_author and self.head_author not in self.authors:
+                self.authors.append(self.head_author)
+
+        if self.before is None:
+            self.before = payload.get("before")
+        self.after = payload.get("after")
+        # push แรกใช้ compare URL จาก GitHub ตรง ๆ, ถ้ารวมหลาย push ให้สร้างช่วง before...after ใหม่
+        if self.pushes > 1 and self.before and self.after and self.before.strip("0"):
+            self.compare_url = f"{self.html_url}/compare/{self.before[:12]}...{self.after[:12]}"
+        else:
+            self.compare_url = payload.get("compare") or self.compare_url
+
+    def author_summary(self):
+        if not self.authors:
+            return "-"
+        shown = ", ".join(self.authors[:MAX_AUTHORS])
+        extra = len(self.authors) - MAX_AUTHORS
+        return f"{shown} (+{extra})" if extra > 0 else shown
+
+
+class PushCoalescer:
+    # flush_handler(batch) -> True ถ้าส่งต่อเข้าคิวส่งได้, False ถ้าคิวเต็ม (batch จะค้างไว้แล้วลองใหม่)
+    # งานส่ง Discord จริงอยู่ใน worker ของ WebhookQueue ตัว coalescer แค่รวมและตั้งเวลา
+    def __init__(self, flush_handler, window=10.0, max_delay=60.0, max_pending=500, retry_interval=1.0):
+        self.flush_handler = flush_handler
+        self.window = window
+        self.max_delay = max(window, max_delay)
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.pending = {}
+        self.timers = {}
+        self.pushes_in = 0
+        self.batches_out = 0
+        self.rejected = 0
+
+    def add(self, payload):
+        # คืน False เมื่อรับไม่ได้ (batch ค้างเต็มหรือคิวส่งเต็ม) ให้ฝั่ง HTTP ตอบ 503
+        repository = payload["repository"]
+        branch = payload.get("ref", "unknown/ref").split("/", 2)[-1]
+        full_name = repository.get("full_name", repository["name"])
+        key = (full_name, branch)
+
+        batch = self.pending.get(key)
+        if batch is None:
+            if len(self.pending) >= self.max_pending:
+                self.rejected += 1
+                return False
+            batch = PushBatch(full_name, repository["name"], branch, repository["html_url"])
+            if self.window <= 0:
+                batch.add(payload)
+                if not self._flush(batch):
+                    self.rejected += 1
+                    return False
+                self.pushes_in += 1
+                return True
+            self.pending[key] = batch
+            self.timers[key] = asyncio.create_task(self._flush_later(key))
+        batch.add(payload)
+        self.pushes_in += 1
+        return True
+
+    async def _flush_later(self, key):
+        batch = self.pending[key]
+        # debounce: เลื่อนเวลา flush ออกไปทุกครั้งที่มี push ใหม่ แต่ไม่เกิน max_delay นับจาก push แรก
+        while True:
+            deadline = min(batch.updated_at + self.window, batch.created_at + self.max_delay)
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        # คิวส่งเต็ม: batch ยังอยู่ใน pending และรวม push ใหม่ต่อได้ระหว่างรอ
+        while not self._flush(batch):
+            await asyncio.sleep(self.retry_interval)
+        self.pending.pop(key, None)
+        self.timers.pop(key, None)
+
+    def _flush(self, batch):
+        if not self.flush_handler(batch):
+            return False
+        self.batches_out += 1
+        return True
+
+    async def flush_all(self, timeout=30.0):
+        # ใช้ตอนปิดระบบ ก่อน drain คิวส่ง
+        timers = list(self.timers.values())
+        for task in timers:
+            task.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        batches = list(self.pending.values())
+        self.pending.clear()
+        self.timers.clear()
+        deadline = time.monotonic() + timeout
+        for batch in batches:
+            while not self._flush(batch):
+                if time.monotonic() >= deadline:
+                    print(f"WARNING: Dropped push batch for {batch.repo_name}/{batch.branch}, delivery queue stayed full.")
+                    break
+                await asyncio.sleep(min(self.retry_interval, 0.1))
+
+    def stats(self):
+        return {
+            "pending_batches": len(self.pending),
+            "max_pending": self.max_pending,
+            "pushes_in": self.pushes_in,
+            "batches_out": self.batches_out,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import aiohttp
+
+from json_store import load_json, WriteBehindJSON
+
+# --------------------------------------------------------------------------------
+## Repository Stats Index (Open PRs / Open Issues)
+# --------------------------------------------------------------------------------
+# นับจำนวน PR/Issue ที่เปิดอยู่ของแต่ละ repo จาก webhook event แบบ incremental
+# แล้วค่อย reconcile กับ GitHub API เป็นครั้งคราว (ไม่ใช่ทุก push)
+
+GITHUB_API_URL = "https://api.github.com"
+
+OPENING_ACTIONS = ("opened", "reopened")
+# deleted/transferred ลดค่าเฉพาะตอนที่ issue ยังเปิดอยู่
+REMOVING_ACTIONS = ("deleted", "transferred")
+# reconcile ไม่สำเร็จ (เช่นโดน rate limit) ให้เว้นช่วงก่อนลองใหม่ จะได้ไม่ยิง API ทุก push
+RECONCILE_RETRY_SECONDS = 300
+
+
+class RepoStatsIndex:
+    def __init__(self, path="repo_stats.json", github_token=None, reconcile_interval=6 * 3600, api_url=GITHUB_API_URL):
+        self.path = path
+        self.api_url = api_url.rstrip("/")
+        self.github_token = github_token
+        self.reconcile_interval = reconcile_interval
+        self.repos = load_json(path, {}) or {}
+        self.store = WriteBehindJSON(path, lambda: self.repos)
+        self.reconciling = {}
+        self.http = None
+
+    def get(self, full_name):
+        entry = self.repos.get(full_name) or {}
+        return entry.get("open_prs"), entry.get("open_issues")
+
+    def _entry(self, full_name):
+        entry = self.repos.get(full_name)
+        if entry is None:
+            entry = {"open_prs": None, "open_issues": None, "reconciled_at": 0, "updated_at": 0}
+            self.repos[full_name] = entry
+        return entry
+
+    def _adjust(self, full_name, field, delta):
+        entry = self._entry(full_name)
+        # ยังไม่เคยรู้ค่าเริ่มต้น ก็ไม่ต้องนับ รอ reconcile ทีเดียว
+        if entry[field] is not None:
+            entry[field] = max(0, entry[field] + delta)
+        entry["updated_at"] = time.time()
+        self.store.mark_dirty()
+
+    def apply_event(self, event, payload):
+        repository = payload.get("repository") or {}
+        full_name = repository.get("full_name")
+        action = payload.get("action")
+        if not full_name:
+            return False
+        if event == "pull_request":
+            field, state = "open_prs", (payload.get("pull_request") or {}).get("state")
+        elif event == "issues":
+            field, state = "open_issues", (payload.get("issue") or {}).get("state")
+        else:
+            return False
+
+        if action in OPENING_ACTIONS:
+            self._adjust(full_name, field, 1)
+        elif action == "closed" or (action in REMOVING_ACTIONS and state == "open"):
+            self._adjust(full_name, field, -1)
+        else:
+            return False
+        return True
+
+    def needs_reconcile(self, full_name):
+        entry = self.repos.get(full_name)
+        if entry is not None and time.time() - entry.get("attempted_at", 0) < RECONCILE_RETRY_SECONDS:
+            return False
+        if entry is None or entry.get("open_prs") is None or entry.get("open_issues") is None:
+            return True
+        return time.time() - entry.get("reconciled_at", 0) > self.reconcile_interval
+
+    async def reconcile(self, full_name):
+        # ถ้ามีอีก task กำลัง reconcile repo เดียวกันอยู่ ให้รอผลเดียวกัน
+        task = self.reconciling.get(full_name)
+        if task is None:
+            task = asyncio.create_task(self._reconcile(full_name))
+            self.reconciling[full_name] = task
+            task.add_done_callback(lambda _: self.reconciling.pop(full_name, None))
+        await asyncio.shield(task)
+
+    async def _reconcile(self, full_name):
+        self._entry(full_name)["attempted_at"] = time.time()
+        try:
+            open_prs = await self._search_count(f"repo:{full_name} is:pr is:open")
+            open_issues = await self._search_count(f"repo:{full_name} is:issue is:open")
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+            print(f"Warning: Could not reconcile repo stats for {full_name}: {e}")
+            return
+        entry = self._entry(full_name)
+        entry["open_prs"] = open_prs
+        entry["open_issues"] = open_issues
+        entry["reconciled_at"] = time.time()
+        self.store.mark_dirty()
+        print(f"Reconciled repo stats for {full_name}: {open_prs} PR(s), {open_issues} issue(s) open")
+
+    async def _search_count(self, query):
+        if self.http is None or self.http.closed:
+            headers = {"Accept": "application/vnd.github+json"}
+            if self.github_token:
+                headers["Authorization"] = f"Bearer {self.github_token}"
+            self.http = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=10))
+        async with self.http.get(f"{self.api_url}/search/issues", params={"q": query, "per_page": 1}) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+            return int(data["total_count"])
+
+    async def close(self):
+        await self.store.close()
+        if self.http is not None:
+            await self.http.close()
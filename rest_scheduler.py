@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# --------------------------------------------------------------------------------
+## Outbound Discord REST Scheduler
+# --------------------------------------------------------------------------------
+# งานส่งข้อความที่ไม่ใช่การตอบ interaction (แจ้งเตือน webhook, แก้ข้อความเก่า) ต้องผ่านคิวนี้
+# แยกเป็น lane ตาม priority และจำกัดอัตราต่อช่องด้วย token bucket
+# การตอบ interaction (response / followup) เรียกตรงเสมอ เพื่อไม่ให้โดนคิวนี้หน่วงเกิน 3 วินาที
+#
+# worker ไม่เคยนั่งรอ token: งานของช่องที่ token หมดจะถูกพักไว้ในคิวรอของช่องนั้น (heap ตาม priority)
+# แล้วตั้ง timer ปล่อยกลับเข้าคิวหลักเมื่อมี token ช่องที่ถูกจำกัดจึงไม่กิน worker ของช่องอื่น
+
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+LANE_NAMES = {PRIORITY_HIGH: "high", PRIORITY_LOW: "low"}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        # ใช้ token ถ้ามี แล้วคืน 0, ถ้าไม่มีคืนเวลาที่ต้องรอโดยไม่จองล่วงหน้า
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return self.time_until_token()
+
+    def time_until_token(self):
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RestScheduler:
+    def __init__(self, workers=4, channel_rate=1.0, channel_burst=5, lane_maxsize=1000):
+        self.queue = asyncio.PriorityQueue()
+        self.worker_count = max(1, workers)
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.lane_maxsize = lane_maxsize
+        self.buckets = {}
+        self.deferred = {}
+        self.timers = {}
+        self.workers = []
+        self.sequence = itertools.count()
+        self.closing = False
+        # lane_depth นับงานที่รับแล้วแต่ยังไม่เริ่ม ทั้งที่อยู่ในคิวหลักและที่พักรอ token
+        self.lane_depth = {lane: 0 for lane in LANE_NAMES}
+        self.outstanding = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        if self.workers:
+            return
+        self.closing = False
+        for worker_id in range(self.worker_count):
+            self.workers.append(asyncio.create_task(self._worker(worker_id)))
+
+    def _bucket(self, channel_id):
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_burst)
+        return bucket
+
+    def submit(self, channel_id, factory, priority=PRIORITY_LOW):
+        # factory = ฟังก์ชันที่คืน coroutine ของ REST call ส่วนผู้เรียก await future ที่ได้กลับไปเพื่อรับผลลัพธ์
+        future = asyncio.get_running_loop().create_future()
+        if self.closing or not self.workers:
+            future.set_exception(RuntimeError("REST scheduler is not running"))
+            return future
+        if self.lane_depth[priority] >= self.lane_maxsize:
+            self.rejected += 1
+            future.set_exception(asyncio.QueueFull(f"REST {LANE_NAMES[priority]} lane is full"))
+            return future
+        self.lane_depth[priority] += 1
+        self.outstanding += 1
+        self.idle.clear()
+        self.queue.put_nowait((priority, next(self.sequence), time.monotonic(), channel_id, factory, future, False))
+        return future
+
+    def _started(self, priority):
+        self.lane_depth[priority] -= 1
+
+    def _finished(self):
+        self.outstanding -= 1
+        if not self.outstanding:
+            self.idle.set()
+
+    def _defer(self, item, wait):
+        channel_id = item[3]
+        heapq.heappush(self.deferred.setdefault(channel_id, []), item)
+        self._arm(channel_id, wait)
+
+    def _arm(self, channel_id, wait):
+        if channel_id not in self.timers:
+            self.timers[channel_id] = asyncio.get_running_loop().call_later(wait, self._release, channel_id)
+
+    def _release(self, channel_id):
+        # ปล่อยงานลำดับแรกของช่องกลับเข้าคิวหลัก (ติด flag ให้ข้ามคิวรอของช่องได้)
+        # คิวรอของช่องยังคงอยู่จนงานที่ปล่อยได้ token เพื่อไม่ให้งานใหม่แซง
+        self.timers.pop(channel_id, None)
+        pending = self.deferred.get(channel_id)
+        while pending:
+            priority, sequence, enqueued_at, _, factory, future, _ = heapq.heappop(pending)
+            if future.cancelled():
+                self._started(priority)
+                self._finished()
+                continue
+            self.queue.put_nowait((priority, sequence, enqueued_at, channel_id, factory, future, True))
+            return
+        self.deferred.pop(channel_id, None)
+
+    def _next_deferred(self, channel_id):
+        # เรียกหลังงานที่ถูกปล่อยออกจากคิวรอแล้ว (ได้ token หรือถูกยกเลิก)
+        if self.deferred.get(channel_id):
+            self._arm(channel_id, self._bucket(channel_id).time_until_token())
+        else:
+            self.deferred.pop(channel_id, None)
+
+    async def _worker(self, worker_id):
+        while True:
+            item = await self.queue.get()
+            priority, _, enqueued_at, channel_id, factory, future, released = item
+            try:
+                if future.cancelled():
+                    self._started(priority)
+                    self._finished()
+                    if released:
+                        self._next_deferred(channel_id)
+                    continue
+                # ช่องที่มีงานพักรออยู่แล้ว ให้เข้าคิวรอของช่อง (เรียงตาม priority) แทนการแซง
+                if not released and channel_id in self.deferred:
+                    heapq.heappush(self.deferred[channel_id], item)
+                    continue
+                wait = self._bucket(channel_id).try_acquire()
+                if wait > 0:
+                    self._defer(item, wait)
+                    continue
+                if released:
+                    self._next_deferred(channel_id)
+                self._started(priority)
+                waited = time.monotonic() - enqueued_at
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                try:
+                    result = await factory()
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.processed += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self._finished()
+            finally:
+                self.queue.task_done()
+
+    async def drain(self, timeout=30.0):
+        self.closing = True
+        if self.workers:
+            try:
+                await asyncio.wait_for(self.idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                print(f"WARNING: REST scheduler drain timed out with {self.outstanding} call(s) left.")
+        for handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    def stats(self):
+        finished = self.processed + self.failed
+        return {
+            "depth": {LANE_NAMES[lane]: depth for lane, depth in self.lane_depth.items()},
+            "deferred_channels": len(self.deferred),
+            "workers": len(self.workers),
+            "channels": len(self.buckets),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_avg_ms": round(self.wait_total / finished * 1000, 2) if finished else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from session_store import session_key
+
+# --------------------------------------------------------------------------------
+## Multi-Session Engine
+# --------------------------------------------------------------------------------
+# หลาย session พร้อมกันได้ แยกตาม (guild, channel, session_id)
+# lookup เป็น O(1) ผ่าน dict และมี lock แยกต่อ key เพื่อไม่ให้ start/end ชนกัน
+
+
+class SessionEngine:
+    def __init__(self, store):
+        self.store = store
+        self.sessions = store.sessions
+        self.locks = {}
+        self.lock_users = {}
+        self.by_channel = {}
+        for session in self.sessions.values():
+            self._index(session)
+
+    def _index(self, session):
+        channel_key = (session["guild_id"], session["channel_id"])
+        self.by_channel.setdefault(channel_key, set()).add(session["session_id"])
+
+    def _unindex(self, session):
+        channel_key = (session["guild_id"], session["channel_id"])
+        names = self.by_channel.get(channel_key)
+        if names is not None:
+            names.discard(session["session_id"])
+            if not names:
+                del self.by_channel[channel_key]
+
+    @asynccontextmanager
+    async def locked(self, guild_id, channel_id, session_id):
+        key = session_key(guild_id, channel_id, session_id)
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+        self.lock_users[key] = self.lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            # ลบ lock ทิ้งเมื่อไม่มีใครรออยู่ จะได้ไม่สะสม lock ของ session ที่จบไปแล้ว
+            self.lock_users[key] -= 1
+            if not self.lock_users[key]:
+                del self.lock_users[key]
+                del self.locks[key]
+
+    def get(self, guild_id, channel_id, session_id):
+        key = session_key(guild_id, channel_id, session_id)
+        session = self.sessions.get(key)
+        if session is None and guild_id:
+            session = self._adopt_legacy(guild_id, channel_id, session_id)
+        return session
+
+    def _adopt_legacy(self, guild_id, channel_id, session_id):
+        # session ที่ย้ายมาจากไฟล์รุ่นเก่าไม่มี guild_id ให้ผูกกับ guild จริงตอนถูกเรียกใช้ครั้งแรก
+        legacy = self.sessions.pop(session_key(0, channel_id, session_id), None)
+        if legacy is None:
+            return None
+        self._unindex(legacy)
+        legacy["guild_id"] = guild_id
+        self.sessions[session_key(guild_id, channel_id, session_id)] = legacy
+        self._index(legacy)
+        self.store.save()
+        return legacy
+
+    def list_channel(self, guild_id, channel_id):
+        names = self.by_channel.get((guild_id or 0, channel_id), set())
+        return sorted(names)
+
+    def start(self, guild_id, channel_id, session_id, **fields):
+        session = {"guild_id": guild_id or 0, "channel_id": channel_id, "session_id": session_id, **fields}
+        self.sessions[session_key(guild_id, channel_id, session_id)] = session
+        self._index(session)
+        self.store.save()
+        return session
+
+    def update(self, session, **fields):
+        session.update(fields)
+        self.store.save()
+
+    def end(self, guild_id, channel_id, session_id):
+        session = self.sessions.pop(session_key(guild_id, channel_id, session_id), None)
+        if session is not None:
+            self._unindex(session)
+            self.store.save()
+        return session
+
+    def active_count(self):
+        return len(self.sessions)
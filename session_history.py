@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+import sqlite3
+import threading
+
+# --------------------------------------------------------------------------------
+## Session History Archive (SQLite)
+# --------------------------------------------------------------------------------
+# เก็บ session ที่จบแล้วแบบ append-only พร้อมตารางสรุปยอด (user_totals / weekly_totals)
+# ที่อัปเดตทุกครั้งที่บันทึก ทำให้ /session stats ไม่ต้อง scan ประวัติทั้งหมด
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    session_id TEXT NOT NULL,
+    host TEXT,
+    link TEXT,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    week INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_guild_start ON sessions (guild_id, start_ts);
+
+CREATE TABLE IF NOT EXISTS session_participants (
+    session_row INTEGER NOT NULL REFERENCES sessions (id),
+    guild_id INTEGER NOT NULL,
+    user_key TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    duration INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_totals (
+    guild_id INTEGER NOT NULL,
+    user_key TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weekly_totals (
+    guild_id INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, week)
+) WITHOUT ROWID;
+"""
+
+# สร้างหลัง migrate เพราะอ้างถึงคอลัมน์ user_key ที่ฐานข้อมูลรุ่นแรกยังไม่มี
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_participants_user_start ON session_participants (guild_id, user_key, start_ts);
+CREATE INDEX IF NOT EXISTS idx_user_totals_seconds ON user_totals (guild_id, seconds DESC);
+"""
+
+SCHEMA_VERSION = 1
+
+# รุ่นแรกเก็บยอดตาม display name ซึ่งซ้ำกันได้และเปลี่ยนได้ รุ่นนี้ใช้ user id เป็น key
+# ข้อมูลเก่าที่ไม่มี id จะได้ key แบบ "name:<ชื่อ>" แยกจากผู้ใช้ที่มี id
+MIGRATE_V1 = """
+DROP INDEX IF EXISTS idx_participants_user_start;
+DROP INDEX IF EXISTS idx_user_totals_seconds;
+ALTER TABLE session_participants ADD COLUMN user_key TEXT NOT NULL DEFAULT '';
+UPDATE session_participants SET user_key = 'name:' || user_name;
+CREATE TABLE user_totals_v1 (
+    guild_id INTEGER NOT NULL,
+    user_key TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_key)
+) WITHOUT ROWID;
+INSERT INTO user_totals_v1 (guild_id, user_key, user_name, sessions, seconds)
+    SELECT guild_id, 'name:' || user_name, user_name, sessions, seconds FROM user_totals;
+DROP TABLE user_totals;
+ALTER TABLE user_totals_v1 RENAME TO user_totals;
+"""
+
+
+def user_key(user_id, name):
+    return str(user_id) if user_id else f"name:{name}"
+
+def participant_entries(participants):
+    # รับได้ทั้ง (user_id, display_name) และชื่ออย่างเดียวจาก session รุ่นเก่า, ตัดคนซ้ำตาม key
+    entries = {}
+    for participant in participants:
+        user_id, name = participant if isinstance(participant, (tuple, list)) else (None, participant)
+        entries.setdefault(user_key(user_id, name), name)
+    return list(entries.items())
+
+
+def week_start(dt):
+    # สัปดาห์เริ่มวันจันทร์ 00:00 ตามเขตเวลาของ dt (เวลาไทย)
+    monday = (dt - datetime.timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(monday.timestamp())
+
+
+class SessionHistory:
+    def __init__(self, path="session_history.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(user_totals)")}
+        if "user_key" not in columns:
+            self.conn.executescript("BEGIN;" + MIGRATE_V1 + "COMMIT;")
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _insert(self, guild_id, channel_id, session_id, host, link, participants, start_dt, end_dt):
+        start_ts = int(start_dt.timestamp())
+        end_ts = int(end_dt.timestamp())
+        duration = max(0, end_ts - start_ts)
+        week = week_start(start_dt)
+        cursor = self.conn.execute(
+            "INSERT INTO sessions (guild_id, channel_id, session_id, host, link, start_ts, end_ts, duration, week) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (guild_id, channel_id, session_id, host, link, start_ts, end_ts, duration, week),
+        )
+        entries = participant_entries(participants)
+        self.conn.executemany(
+            "INSERT INTO session_participants (session_row, guild_id, user_key, user_name, start_ts, week, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, guild_id, key, name, start_ts, week, duration) for key, name in entries],
+        )
+        # ชื่อที่แสดงใช้ชื่อล่าสุดเสมอ ยอดรวมผูกกับ id จึงไม่แตก/ไม่รวมกันเมื่อเปลี่ยนชื่อหรือชื่อซ้ำ
+        self.conn.executemany(
+            "INSERT INTO user_totals (guild_id, user_key, user_name, sessions, seconds) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (guild_id, user_key) DO UPDATE SET user_name = excluded.user_name, sessions = sessions + 1, seconds = seconds + excluded.seconds",
+            [(guild_id, key, name, duration) for key, name in entries],
+        )
+        self.conn.execute(
+            "INSERT INTO weekly_totals (guild_id, week, sessions, seconds) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (guild_id, week) DO UPDATE SET sessions = sessions + 1, seconds = seconds + excluded.seconds",
+            (guild_id, week, duration),
+        )
+
+    def record_many(self, records):
+        with self.lock, self.conn:
+            for record in records:
+                self._insert(*record)
+
+    async def record(self, guild_id, channel_id, session_id, host, link, participants, start_dt, end_dt):
+        record = (guild_id, channel_id, session_id, host, link, participants, start_dt, end_dt)
+        await asyncio.to_thread(self.record_many, [record])
+
+    def stats_sync(self, guild_id, user_id=None, top=10, weeks=4):
+        with self.lock:
+            top_users = self.conn.execute(
+                "SELECT user_name, sessions, seconds FROM user_totals WHERE guild_id = ? ORDER BY seconds DESC LIMIT ?",
+                (guild_id, top),
+            ).fetchall()
+            weekly = self.conn.execute(
+                "SELECT week, sessions, seconds FROM weekly_totals WHERE guild_id = ? ORDER BY week DESC LIMIT ?",
+                (guild_id, weeks),
+            ).fetchall()
+            user = None
+            user_weekly = []
+            if user_id:
+                key = user_key(user_id, None)
+                user = self.conn.execute(
+                    "SELECT sessions, seconds FROM user_totals WHERE guild_id = ? AND user_key = ?",
+                    (guild_id, key),
+                ).fetchone()
+                if weekly:
+                    user_weekly = self.conn.execute(
+                        "SELECT week, COUNT(*), SUM(duration) FROM session_participants "
+                        "WHERE guild_id = ? AND user_key = ? AND start_ts >= ? GROUP BY week ORDER BY week DESC",
+                        (guild_id, key, weekly[-1][0]),
+                    ).fetchall()
+        return {"top_users": top_users, "weekly": weekly, "user": user, "user_weekly": user_weekly}
+
+    async def stats(self, guild_id, user_id=None, top=10, weeks=4):
+        return await asyncio.to_thread(self.stats_sync, guild_id, user_id, top, weeks)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,129 @@
+import datetime
+import os
+import shutil
+
+from json_store import load_json, WriteBehindJSON
+
+# --------------------------------------------------------------------------------
+## Session Storage (session.json)
+# --------------------------------------------------------------------------------
+# เก็บข้อมูล Live Share Session แบบ atomic + write-behind
+# version 1 = ไฟล์รุ่นเก่าที่เป็น dict ของ session ตรง ๆ ไม่มี field "version"
+# version 2 = {"version": 2, "session": {...}}
+# version 3 = {"version": 3, "sessions": {"<guild>:<channel>:<session_id>": {...}}}
+
+SCHEMA_VERSION = 3
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_SESSION_ID = "main"
+
+
+def session_key(guild_id, channel_id, session_id):
+    # guild 0 = DM หรือ session ที่ย้ายมาจากไฟล์รุ่นเก่าซึ่งไม่ได้เก็บ guild ไว้
+    return f"{guild_id or 0}:{channel_id}:{session_id}"
+
+
+def normalize_time(value):
+    # รองรับทั้งรูปแบบของ get_bkk_time และ ISO 8601 (เช่น "2025-10-04T10:15:00") จากไฟล์รุ่นเก่า
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("time must be a string")
+    try:
+        return datetime.datetime.strptime(value, TIME_FORMAT).strftime(TIME_FORMAT)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+        return parsed.replace(tzinfo=None).strftime(TIME_FORMAT)
+
+def validate_session(session):
+    if not isinstance(session, dict):
+        raise ValueError("session must be an object")
+    if not session:
+        return {}
+    link = session.get("link")
+    if not isinstance(link, str) or not link:
+        raise ValueError("link must be a non-empty string")
+    participants = session.get("participants") or []
+    if not isinstance(participants, list) or not all(isinstance(p, str) for p in participants):
+        raise ValueError("participants must be a list of names")
+    # participant_ids ขนานกับ participants (id ใช้เป็น key ของสถิติ) session รุ่นเก่าไม่มี
+    participant_ids = session.get("participant_ids")
+    if participant_ids is not None and (not isinstance(participant_ids, list) or len(participant_ids) != len(participants) or not all(isinstance(i, int) for i in participant_ids)):
+        raise ValueError("participant_ids must be a list of user ids matching participants")
+    message_id = session.get("last_message_id")
+    if message_id is not None and not isinstance(message_id, int):
+        raise ValueError("last_message_id must be an integer")
+    if session.get("host") is not None and not isinstance(session.get("host"), str):
+        raise ValueError("host must be a string")
+    for field in ("guild_id", "channel_id"):
+        if not isinstance(session.get(field, 0), int):
+            raise ValueError(f"{field} must be an integer")
+    return {
+        "guild_id": session.get("guild_id", 0),
+        "channel_id": session.get("channel_id", 0),
+        "session_id": str(session.get("session_id", DEFAULT_SESSION_ID)),
+        "host": session.get("host") or (participants[0] if participants else None),
+        "link": link,
+        "participants": participants,
+        "participant_ids": participant_ids,
+        "start_time": normalize_time(session.get("start_time")),
+        "start_ts": session.get("start_ts") if isinstance(session.get("start_ts"), (int, float)) else None,
+        "end_time": normalize_time(session.get("end_time")),
+        "last_message_id": message_id,
+    }
+
+def migrate(raw, legacy_channel_id=0):
+    if not raw:
+        return {"version": SCHEMA_VERSION, "sessions": {}}
+    version = raw.get("version", 1) if isinstance(raw, dict) else None
+    if version == 1:
+        raw = {"version": 2, "session": raw}
+        version = 2
+    if version == 2:
+        # session เดียวของรุ่นเก่าผูกกับช่อง dashboard เสมอ
+        session = dict(raw.get("session") or {})
+        sessions = {}
+        if session:
+            session.update(guild_id=0, channel_id=legacy_channel_id, session_id=DEFAULT_SESSION_ID)
+            sessions[session_key(0, legacy_channel_id, DEFAULT_SESSION_ID)] = session
+        raw = {"version": 3, "sessions": sessions}
+        version = 3
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"unsupported schema version {version!r}")
+    return raw
+
+
+class SessionStore:
+    def __init__(self, path="session.json", delay=0.5, legacy_channel_id=0):
+        self.path = path
+        self.legacy_channel_id = legacy_channel_id
+        self.sessions = self.load()
+        self.writer = WriteBehindJSON(path, self.snapshot, delay)
+
+    def load(self):
+        raw = load_json(self.path, {})
+        try:
+            sessions = migrate(raw, self.legacy_channel_id).get("sessions", {})
+            if not isinstance(sessions, dict):
+                raise ValueError("sessions must be an object")
+            loaded = {}
+            for session in sessions.values():
+                session = validate_session(session)
+                if session:
+                    loaded[session_key(session["guild_id"], session["channel_id"], session["session_id"])] = session
+            return loaded
+        except (ValueError, TypeError) as e:
+            # เก็บไฟล์เสียไว้ตรวจสอบทีหลัง แล้วเริ่มใหม่ด้วยข้อมูลว่าง
+            backup = f"{self.path}.invalid"
+            print(f"WARNING: Invalid session data in {self.path} ({e}), copied to {backup}.")
+            if os.path.exists(self.path):
+                shutil.copyfile(self.path, backup)
+            return {}
+
+    def snapshot(self):
+        return {"version": SCHEMA_VERSION, "sessions": self.sessions}
+
+    def save(self):
+        self.writer.mark_dirty()
+
+    async def close(self):
+        await self.writer.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# โมดูลของบอทอยู่ที่ root ของ repo (ไม่ได้เป็น package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
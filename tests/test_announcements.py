@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import announcements
+from announcements import PublicOnlyResolver, is_public_address, parse_channel_ids, validate_image_url
+
+
+@pytest.mark.parametrize("address, public", [
+    ("127.0.0.1", False),
+    ("10.1.2.3", False),
+    ("172.16.0.1", False),
+    ("192.168.1.1", False),
+    ("169.254.169.254", False),
+    ("0.0.0.0", False),
+    ("::1", False),
+    ("fe80::1%eth0", False),
+    ("fd00::1", False),
+    ("224.0.0.1", False),
+    ("8.8.8.8", True),
+    ("2606:4700:4700::1111", True),
+])
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
+
+def test_internal_hosts_are_never_requested():
+    hits = []
+
+    async def image(request):
+        hits.append(request.method)
+        return web.Response(body=b"x", content_type="image/png")
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route("*", "/a.png", image)
+        async with TestServer(app, host="127.0.0.1") as server:
+            return [
+                await validate_image_url(str(server.make_url("/a.png"))),
+                await validate_image_url(f"http://localhost:{server.port}/a.png"),
+                await validate_image_url("http://169.254.169.254/latest/meta-data/"),
+                await validate_image_url("ftp://example.com/a.png"),
+            ]
+
+    results = asyncio.run(scenario())
+    assert hits == []
+    assert all(valid is False for valid, _ in results)
+    # เหตุผลที่ตอบกลับต้องไม่เปิดเผยรายละเอียดของปลายทาง
+    assert not any("HTTP" in reason or "image/" in reason for _, reason in results)
+
+def test_resolver_blocks_internal_addresses_on_connect():
+    async def scenario():
+        with pytest.raises(OSError):
+            await PublicOnlyResolver().resolve("localhost", 80)
+
+    asyncio.run(scenario())
+
+def redirect_scenario(monkeypatch, location_for):
+    # 127.0.0.1 ถือเป็น host สาธารณะในเทสต์นี้ ส่วน 127.0.0.2 เป็นเครื่องภายใน
+    monkeypatch.setattr(announcements, "is_public_address", lambda address: address == "127.0.0.1")
+    internal_hits = []
+
+    async def secret(request):
+        internal_hits.append(request.method)
+        return web.Response(body=b"x", content_type="image/png")
+
+    async def public_image(request):
+        return web.Response(body=b"x", content_type="image/png")
+
+    async def scenario():
+        internal_app = web.Application()
+        internal_app.router.add_route("*", "/secret.png", secret)
+        async with TestServer(internal_app, host="127.0.0.2") as internal:
+            async def hop(request):
+                raise web.HTTPFound(location_for(internal, int(request.match_info["n"])))
+
+            public_app = web.Application()
+            public_app.router.add_route("*", "/hop/{n}", hop)
+            public_app.router.add_route("*", "/a.png", public_image)
+            async with TestServer(public_app, host="127.0.0.1") as public:
+                return await validate_image_url(str(public.make_url("/hop/0")))
+
+    return asyncio.run(scenario()), internal_hits
+
+def test_redirect_to_internal_ip_literal_is_not_followed(monkeypatch):
+    result, internal_hits = redirect_scenario(
+        monkeypatch, lambda internal, n: f"http://127.0.0.2:{internal.port}/secret.png",
+    )
+    assert internal_hits == []
+    assert result == (False, "เปิดลิงก์รูปภาพไม่ได้")
+
+def test_redirects_between_public_hosts_are_followed_up_to_limit(monkeypatch):
+    result, _ = redirect_scenario(monkeypatch, lambda internal, n: "/a.png" if n >= 2 else f"/hop/{n + 1}")
+    assert result == (True, None)
+    result, _ = redirect_scenario(monkeypatch, lambda internal, n: f"/hop/{n + 1}")
+    assert result[0] is False
+
+def test_parse_channel_ids():
+    text = "<#123456789012345678>, 223456789012345678 <#123456789012345678> 42"
+    assert parse_channel_ids(text) == [123456789012345678, 223456789012345678]
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp import web
+
+from delivery_dedup import DeliveryDedup
+from webhook_ingest import make_webhook_handler
+
+SECRET = "test-secret"
+
+
+def signed(body):
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+def push_body(n):
+    return json.dumps({
+        "ref": "refs/heads/main",
+        "repository": {"name": "repo", "full_name": "org/repo", "html_url": "https://github.com/org/repo"},
+        "commits": [{"author": {"name": f"dev{n}"}}],
+        "head_commit": {"message": f"commit {n}", "url": "https://github.com/org/repo/commit/x", "author": {"name": f"dev{n}"}},
+    }).encode()
+
+async def post(client, delivery_id, body, event="push"):
+    headers = {"X-GitHub-Event": event, "X-GitHub-Delivery": delivery_id, "X-Hub-Signature-256": signed(body)}
+    response = await client.post("/webhook", data=body, headers=headers)
+    return response.status
+
+async def run_with_client(dedup, dispatch, scenario):
+    app = web.Application()
+    app.router.add_post("/webhook", make_webhook_handler(SECRET, dispatch, dedup=dedup))
+    async with TestClient(TestServer(app)) as client:
+        return await scenario(client)
+
+# burst ที่บันทึกไว้: 20 delivery ไม่ซ้ำกัน แต่ละอันถูกส่งซ้ำ 1-3 ครั้งสลับลำดับกัน
+BURST = [f"delivery-{i % 20}" for i in (list(range(20)) + list(range(0, 20, 2)) + list(range(0, 20, 3)) + list(range(19, -1, -5)))]
+
+
+def test_burst_with_duplicates_dispatches_each_delivery_once(tmp_path):
+    dispatched = []
+
+    async def dispatch(event):
+        dispatched.append(event["delivery"])
+        return True
+
+    async def scenario(client):
+        # ส่งพร้อมกันเป็นชุด เพื่อให้ตัวซ้ำแข่งกันระหว่างรอ SQLite
+        return await asyncio.gather(*(post(client, delivery_id, push_body(i)) for i, delivery_id in enumerate(BURST)))
+
+    dedup = DeliveryDedup(str(tmp_path / "deliveries.db"))
+    statuses = asyncio.run(run_with_client(dedup, dispatch, scenario))
+    dedup.close()
+
+    assert set(statuses) == {200}
+    assert sorted(dispatched) == sorted(set(BURST))
+    assert dedup.duplicates == len(BURST) - len(set(BURST))
+
+def test_claims_survive_restart(tmp_path):
+    path = str(tmp_path / "deliveries.db")
+    dispatched = []
+
+    async def dispatch(event):
+        dispatched.append(event["delivery"])
+        return True
+
+    async def first_run(client):
+        return [await post(client, f"delivery-{i}", push_body(i)) for i in range(5)]
+
+    async def second_run(client):
+        # process ใหม่ หน่วยความจำว่าง ต้องจำได้จาก SQLite อย่างเดียว
+        return [await post(client, f"delivery-{i}", push_body(i)) for i in range(7)]
+
+    dedup = DeliveryDedup(path)
+    asyncio.run(run_with_client(dedup, dispatch, first_run))
+    dedup.close()
+    restarted = DeliveryDedup(path)
+    asyncio.run(run_with_client(restarted, dispatch, second_run))
+    restarted.close()
+
+    assert dispatched == [f"delivery-{i}" for i in range(5)] + ["delivery-5", "delivery-6"]
+    assert restarted.duplicates == 5
+
+def test_failed_deliveries_are_released_for_redelivery(tmp_path):
+    dispatched = []
+    fail_next = {"dispatch": True}
+
+    async def dispatch(event):
+        if fail_next["dispatch"]:
+            fail_next["dispatch"] = False
+            raise RuntimeError("handoff unavailable")
+        dispatched.append(event["delivery"])
+        return True
+
+    async def scenario(client):
+        statuses = []
+        for delivery_id, body in (("bad-list", b"[]"), ("bad-string", b'"x"'), ("bad-ref", b'{"ref": 5}')):
+            statuses.append(await post(client, delivery_id, body))
+            # GitHub ส่งซ้ำ id เดิม ต้องไม่ถูกมองเป็น duplicate
+            statuses.append(await post(client, delivery_id, body))
+        statuses.append(await post(client, "dispatch-error", push_body(0)))
+        statuses.append(await post(client, "dispatch-error", push_body(0)))
+        return statuses
+
+    dedup = DeliveryDedup(str(tmp_path / "deliveries.db"))
+    statuses = asyncio.run(run_with_client(dedup, dispatch, scenario))
+    dedup.close()
+
+    assert statuses == [400, 400, 400, 400, 400, 400, 500, 200]
+    assert dispatched == ["dispatch-error"]
+    assert dedup.duplicates == 0
@@ -0,0 +1,79 @@
+import asyncio
+import sqlite3
+
+from handoff import HandoffQueue
+
+
+def run_consumer(queue, dispatch, until, timeout=2.0):
+    async def scenario():
+        task = asyncio.create_task(queue.consume(dispatch, poll_interval=0.01, max_backoff=0.05, max_attempts=3))
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not until() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        # consumer ต้องยังทำงานอยู่ ไม่ตายไปเพราะ error
+        alive = not task.done()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return alive
+
+    return asyncio.run(scenario())
+
+def test_dispatch_error_is_retried_without_killing_consumer(tmp_path):
+    queue = HandoffQueue(str(tmp_path / "handoff.db"))
+    for i in range(3):
+        queue.put({"n": i})
+    received = []
+    failures = {"left": 1}
+
+    async def dispatch(event):
+        if event["n"] == 1 and failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("boom")
+        received.append(event["n"])
+        return True
+
+    alive = run_consumer(queue, dispatch, lambda: len(received) == 3)
+    assert alive
+    assert received == [0, 1, 2]
+    assert queue.depth() == 0 and queue.errors == 1
+    queue.close()
+
+def test_poison_event_is_dropped_after_max_attempts(tmp_path):
+    queue = HandoffQueue(str(tmp_path / "handoff.db"))
+    queue.put({"n": "poison"})
+    queue.put({"n": 1})
+    received = []
+
+    async def dispatch(event):
+        if event["n"] == "poison":
+            raise ValueError("bad event")
+        received.append(event["n"])
+        return True
+
+    alive = run_consumer(queue, dispatch, lambda: received == [1])
+    assert alive and received == [1]
+    assert queue.depth() == 0
+    queue.close()
+
+def test_sqlite_error_backs_off_and_recovers(tmp_path):
+    queue = HandoffQueue(str(tmp_path / "handoff.db"))
+    queue.put({"n": 1})
+    original_fetch = queue._fetch
+    failures = {"left": 2}
+
+    def flaky_fetch(limit):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return original_fetch(limit)
+
+    queue._fetch = flaky_fetch
+    received = []
+
+    async def dispatch(event):
+        received.append(event["n"])
+        return True
+
+    alive = run_consumer(queue, dispatch, lambda: received == [1])
+    assert alive and received == [1] and queue.errors == 2
+    queue.close()
@@ -0,0 +1,68 @@
+import asyncio
+
+from push_coalescer import PushCoalescer
+
+
+def push(repo="org/repo", branch="main", author="dev"):
+    return {
+        "repository": {"name": repo.split("/")[-1], "full_name": repo, "html_url": f"https://github.com/{repo}"},
+        "ref": f"refs/heads/{branch}",
+        "commits": [{"author": {"name": author}}],
+        "head_commit": {"message": "msg", "url": "u", "author": {"name": author}},
+    }
+
+def test_pushes_to_same_branch_become_one_batch():
+    async def scenario():
+        submitted = []
+        coalescer = PushCoalescer(lambda batch: submitted.append(batch) or True, window=0.05, max_delay=1)
+        for i in range(5):
+            assert coalescer.add(push(author=f"dev{i}"))
+        assert coalescer.add(push(branch="other"))
+        await asyncio.sleep(0.2)
+        return submitted
+
+    submitted = asyncio.run(scenario())
+    assert sorted((batch.branch, batch.pushes) for batch in submitted) == [("main", 5), ("other", 1)]
+
+def test_pending_batches_are_capped():
+    async def scenario():
+        coalescer = PushCoalescer(lambda batch: True, window=10, max_delay=10, max_pending=3)
+        accepted = [coalescer.add(push(branch=f"b{i}")) for i in range(5)]
+        # branch ที่มี batch ค้างอยู่แล้วยังรวมเพิ่มได้
+        accepted.append(coalescer.add(push(branch="b0")))
+        stats = coalescer.stats()
+        await coalescer.flush_all(1)
+        return accepted, stats
+
+    accepted, stats = asyncio.run(scenario())
+    assert accepted == [True, True, True, False, False, True]
+    assert stats["pending_batches"] == 3 and stats["rejected"] == 2
+
+def test_full_delivery_queue_keeps_batch_and_retries():
+    async def scenario():
+        submitted = []
+        room = {"free": False}
+
+        def submit(batch):
+            if not room["free"]:
+                return False
+            submitted.append(batch)
+            return True
+
+        coalescer = PushCoalescer(submit, window=0.01, max_delay=1, retry_interval=0.02)
+        coalescer.add(push())
+        await asyncio.sleep(0.05)
+        # ระหว่างรอคิวว่าง push ใหม่ยังรวมเข้า batch เดิม
+        coalescer.add(push())
+        room["free"] = True
+        await asyncio.sleep(0.1)
+        return submitted, coalescer.stats()
+
+    submitted, stats = asyncio.run(scenario())
+    assert [batch.pushes for batch in submitted] == [2]
+    assert stats["pending_batches"] == 0
+
+def test_zero_window_reports_backpressure():
+    coalescer = PushCoalescer(lambda batch: False, window=0)
+    assert coalescer.add(push()) is False
+    assert coalescer.stats()["pushes_in"] == 0
@@ -0,0 +1,72 @@
+import asyncio
+
+from repo_stats import RepoStatsIndex
+
+REPO = "org/repo"
+
+
+def pr(action, state):
+    return "pull_request", {"action": action, "repository": {"full_name": REPO}, "pull_request": {"state": state}}
+
+def issue(action, state):
+    return "issues", {"action": action, "repository": {"full_name": REPO}, "issue": {"state": state}}
+
+def replay(tmp_path, events, baseline=None, search_counts=None):
+    # เล่น event ตามลำดับที่บันทึกไว้ แล้วคืนค่า (open_prs, open_issues) พร้อมผลของ apply_event แต่ละครั้ง
+    async def scenario():
+        index = RepoStatsIndex(str(tmp_path / "repo_stats.json"))
+        queries = []
+        if search_counts is not None:
+            async def search_count(query):
+                queries.append(query)
+                return search_counts["pr" if "is:pr" in query else "issue"]
+            index._search_count = search_count
+        if baseline is not None:
+            index.repos[REPO] = {"open_prs": baseline[0], "open_issues": baseline[1], "reconciled_at": 0, "updated_at": 0}
+        applied = [index.apply_event(event, payload) for event, payload in events]
+        if search_counts is not None and index.needs_reconcile(REPO):
+            await index.reconcile(REPO)
+        counts = index.get(REPO)
+        await index.close()
+        return counts, applied, queries
+
+    return asyncio.run(scenario())
+
+def test_pull_request_lifecycle(tmp_path):
+    events = [pr("opened", "open"), pr("opened", "open"), pr("closed", "closed"), pr("reopened", "open"), pr("synchronize", "open"), pr("edited", "open")]
+    counts, applied, _ = replay(tmp_path, events, baseline=(3, 0))
+    assert counts == (5, 0)
+    assert applied == [True, True, True, True, False, False]
+
+def test_issue_deleted_and_transferred_only_count_while_open(tmp_path):
+    events = [
+        issue("opened", "open"),
+        issue("deleted", "open"),
+        issue("transferred", "open"),
+        issue("closed", "closed"),
+        issue("deleted", "closed"),
+        issue("transferred", "closed"),
+        issue("labeled", "open"),
+    ]
+    counts, applied, _ = replay(tmp_path, events, baseline=(0, 4))
+    assert counts == (0, 2)
+    assert applied == [True, True, True, True, False, False, False]
+
+def test_counts_never_go_negative(tmp_path):
+    counts, _, _ = replay(tmp_path, [pr("closed", "closed"), pr("closed", "closed"), issue("closed", "closed")], baseline=(1, 0))
+    assert counts == (0, 0)
+
+def test_unknown_baseline_stays_none_until_reconciled(tmp_path):
+    counts, applied, _ = replay(tmp_path, [pr("opened", "open"), issue("opened", "open"), issue("closed", "closed")])
+    assert counts == (None, None)
+    assert applied == [True, True, True]
+
+def test_reconcile_sets_baseline_from_search(tmp_path):
+    counts, _, queries = replay(tmp_path, [pr("opened", "open")], search_counts={"pr": 7, "issue": 2})
+    assert counts == (7, 2)
+    assert queries == [f"repo:{REPO} is:pr is:open", f"repo:{REPO} is:issue is:open"]
+
+def test_counts_persist_across_restart(tmp_path):
+    replay(tmp_path, [pr("opened", "open"), issue("opened", "open")], baseline=(2, 2))
+    counts, _, _ = replay(tmp_path, [pr("closed", "closed")])
+    assert counts == (2, 3)
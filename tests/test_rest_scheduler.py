@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from rest_scheduler import PRIORITY_HIGH, PRIORITY_LOW, RestScheduler
+
+
+def make_call(log, name):
+    async def call():
+        log.append((name, time.monotonic()))
+        return name
+    return call
+
+def test_rate_limited_channel_does_not_block_other_channels():
+    async def scenario():
+        scheduler = RestScheduler(workers=2, channel_rate=20.0, channel_burst=1)
+        scheduler.start()
+        log = []
+        started = time.monotonic()
+        burst = [scheduler.submit(1, make_call(log, f"low-{i}")) for i in range(20)]
+        await asyncio.sleep(0.01)
+        high = scheduler.submit(2, make_call(log, "high"), PRIORITY_HIGH)
+        await high
+        high_latency = time.monotonic() - started
+        await asyncio.gather(*burst)
+        await scheduler.drain(5)
+        return log, high_latency, started
+
+    log, high_latency, started = asyncio.run(scenario())
+    assert high_latency < 0.1
+    low_times = [at for name, at in log if name.startswith("low-")]
+    # ช่อง 1 ยังถูกจำกัดที่ 20 ครั้ง/วินาที
+    assert low_times[-1] - started >= 19 / 20 - 0.05
+    assert [name for name, _ in log if name.startswith("low-")] == [f"low-{i}" for i in range(20)]
+
+def test_high_priority_jumps_queued_calls_on_the_same_channel():
+    async def scenario():
+        scheduler = RestScheduler(workers=1, channel_rate=50.0, channel_burst=1)
+        scheduler.start()
+        log = []
+        futures = [scheduler.submit(1, make_call(log, f"low-{i}")) for i in range(5)]
+        await asyncio.sleep(0.005)
+        futures.append(scheduler.submit(1, make_call(log, "high"), PRIORITY_HIGH))
+        await asyncio.gather(*futures)
+        await scheduler.drain(5)
+        return [name for name, _ in log]
+
+    order = asyncio.run(scenario())
+    assert order.index("high") < order.index("low-4")
+
+def test_full_lane_rejects_new_calls():
+    async def scenario():
+        scheduler = RestScheduler(workers=1, channel_rate=1.0, channel_burst=1, lane_maxsize=3)
+        scheduler.start()
+        log = []
+        futures = [scheduler.submit(1, make_call(log, f"low-{i}"), PRIORITY_LOW) for i in range(4)]
+        high = scheduler.submit(1, make_call(log, "high"), PRIORITY_HIGH)
+        results = await asyncio.gather(futures[3], return_exceptions=True)
+        for future in futures[:3] + [high]:
+            future.cancel()
+        await scheduler.drain(1)
+        return results, scheduler.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.QueueFull)
+    assert stats["rejected"] == 1
+
+def test_drain_waits_for_deferred_calls():
+    async def scenario():
+        scheduler = RestScheduler(workers=1, channel_rate=20.0, channel_burst=1)
+        scheduler.start()
+        log = []
+        for i in range(5):
+            scheduler.submit(1, make_call(log, f"call-{i}"))
+        await scheduler.drain(5)
+        return log, scheduler.stats()
+
+    log, stats = asyncio.run(scenario())
+    assert len(log) == 5
+    assert stats["processed"] == 5 and stats["depth"] == {"high": 0, "low": 0}
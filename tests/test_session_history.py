@@ -0,0 +1,69 @@
+import datetime
+import sqlite3
+import zoneinfo
+
+from session_history import SessionHistory
+
+BKK = zoneinfo.ZoneInfo("Asia/Bangkok")
+START = datetime.datetime(2025, 10, 6, 10, 0, tzinfo=BKK)
+
+
+def record(history, participants, hours=1, guild_id=1):
+    history.record_many([(guild_id, 10, "main", None, "https://x", participants, START, START + datetime.timedelta(hours=hours))])
+
+def test_totals_follow_user_id_across_renames(tmp_path):
+    history = SessionHistory(str(tmp_path / "history.db"))
+    record(history, [(1, "Alice")])
+    record(history, [(1, "Alice (away)")], hours=2)
+    stats = history.stats_sync(1, 1)
+    history.close()
+    assert stats["top_users"] == [("Alice (away)", 2, 3 * 3600)]
+    assert stats["user"] == (2, 3 * 3600)
+    assert stats["user_weekly"][0][1:] == (2, 3 * 3600)
+
+def test_same_display_name_does_not_merge_users(tmp_path):
+    history = SessionHistory(str(tmp_path / "history.db"))
+    record(history, [(1, "Sam"), (2, "Sam")])
+    record(history, [(2, "Sam")])
+    stats = history.stats_sync(1, 1)
+    history.close()
+    assert sorted(stats["top_users"]) == [("Sam", 1, 3600), ("Sam", 2, 7200)]
+    assert stats["user"] == (1, 3600)
+
+def test_first_schema_database_is_migrated(tmp_path):
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE sessions (id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, session_id TEXT NOT NULL,
+            host TEXT, link TEXT, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL, duration INTEGER NOT NULL, week INTEGER NOT NULL);
+        CREATE TABLE session_participants (session_row INTEGER NOT NULL, guild_id INTEGER NOT NULL, user_name TEXT NOT NULL,
+            start_ts INTEGER NOT NULL, week INTEGER NOT NULL, duration INTEGER NOT NULL);
+        CREATE INDEX idx_participants_user_start ON session_participants (guild_id, user_name, start_ts);
+        CREATE TABLE user_totals (guild_id INTEGER NOT NULL, user_name TEXT NOT NULL, sessions INTEGER NOT NULL, seconds INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, user_name)) WITHOUT ROWID;
+        CREATE INDEX idx_user_totals_seconds ON user_totals (guild_id, seconds DESC);
+        CREATE TABLE weekly_totals (guild_id INTEGER NOT NULL, week INTEGER NOT NULL, sessions INTEGER NOT NULL, seconds INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, week)) WITHOUT ROWID;
+        INSERT INTO user_totals VALUES (1, 'Legacy', 4, 14400);
+        INSERT INTO session_participants VALUES (1, 1, 'Legacy', 0, 0, 3600);
+    """)
+    conn.close()
+
+    history = SessionHistory(path)
+    record(history, [(7, "Legacy")])
+    stats = history.stats_sync(1, 7)
+    history.close()
+    # ข้อมูลเก่าไม่มี id จึงยังอยู่แยกในชื่อเดิม ไม่ถูกรวมกับผู้ใช้ที่มี id
+    assert sorted(stats["top_users"]) == [("Legacy", 1, 3600), ("Legacy", 4, 14400)]
+    assert stats["user"] == (1, 3600)
+
+    reopened = SessionHistory(path)
+    assert reopened.conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    reopened.close()
+
+def test_legacy_name_only_participants_are_accepted(tmp_path):
+    history = SessionHistory(str(tmp_path / "history.db"))
+    record(history, ["Old", "Old"])
+    stats = history.stats_sync(1)
+    history.close()
+    assert stats["top_users"] == [("Old", 1, 3600)]
@@ -0,0 +1,40 @@
+import json
+
+from session_store import SCHEMA_VERSION, SessionStore, session_key
+
+
+def write(path, data):
+    path.write_text(data if isinstance(data, str) else json.dumps(data), encoding="utf-8")
+
+def valid_session(**overrides):
+    session = {"guild_id": 1, "channel_id": 2, "session_id": "main", "host": "a", "link": "https://x", "participants": ["a"], "start_time": "2025-10-04 10:15:00"}
+    session.update(overrides)
+    return session
+
+def test_loads_current_schema(tmp_path):
+    path = tmp_path / "session.json"
+    write(path, {"version": SCHEMA_VERSION, "sessions": {"1:2:main": valid_session()}})
+    store = SessionStore(str(path))
+    assert store.sessions[session_key(1, 2, "main")]["link"] == "https://x"
+
+def test_migrates_legacy_file(tmp_path):
+    path = tmp_path / "session.json"
+    write(path, {"link": "https://x", "participants": ["a"], "start_time": "2025-10-04T10:15:00"})
+    store = SessionStore(str(path), legacy_channel_id=9)
+    session = store.sessions[session_key(0, 9, "main")]
+    assert session["start_time"] == "2025-10-04 10:15:00"
+
+def test_wrong_types_are_backed_up_instead_of_crashing(tmp_path):
+    path = tmp_path / "session.json"
+    for bad in (valid_session(start_time=12345), valid_session(end_time=["x"]), valid_session(host=5), valid_session(participants="a")):
+        write(path, {"version": SCHEMA_VERSION, "sessions": {"1:2:main": bad}})
+        store = SessionStore(str(path))
+        assert store.sessions == {}
+        assert json.loads((tmp_path / "session.json.invalid").read_text(encoding="utf-8"))["sessions"]["1:2:main"] == bad
+
+def test_undecodable_file_is_backed_up(tmp_path):
+    path = tmp_path / "session.json"
+    write(path, '{"version": 3, "sessions": {')
+    store = SessionStore(str(path))
+    assert store.sessions == {}
+    assert (tmp_path / "session.json.invalid").read_text(encoding="utf-8") == '{"version": 3, "sessions": {'
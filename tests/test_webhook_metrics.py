@@ -0,0 +1,25 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from webhook_ingest import WEBHOOK_EVENTS, make_webhook_handler
+
+
+def test_unsubscribed_event_names_share_one_metric_label():
+    async def dispatch(event):
+        return True
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/webhook", make_webhook_handler("secret", dispatch))
+        async with TestClient(TestServer(app)) as client:
+            # ไม่มีลายเซ็น และชื่อ event สุ่มมาจากผู้ส่ง
+            for i in range(50):
+                response = await client.post("/webhook", data=b"{}", headers={"X-GitHub-Event": f"random-{i}"})
+                assert response.status == 200
+
+    before = set(WEBHOOK_EVENTS.children)
+    asyncio.run(scenario())
+    assert set(WEBHOOK_EVENTS.children) - before <= {("other", "unsubscribed")}
+    assert not any(values[0].startswith("random-") for values in WEBHOOK_EVENTS.children)
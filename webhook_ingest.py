@@ -0,0 +1,179 @@
+import hashlib
+import hmac
+import json
+
+from aiohttp import web
+
+import metrics
+
+try:
+    # orjson เร็วกว่า json มาตรฐานหลายเท่ากับ payload ขนาดใหญ่ ถ้าไม่ได้ติดตั้งก็ใช้ json ปกติ
+    import orjson
+    loads_json = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    loads_json = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+# --------------------------------------------------------------------------------
+## GitHub Webhook Ingest (verify / parse / normalise)
+# --------------------------------------------------------------------------------
+# ใช้ร่วมกันทั้ง server ที่ฝังใน bot.py และ service แยก github_webhook.py
+# event ที่ผ่านการ normalise แล้วจะเหลือเฉพาะ field ที่ฝั่ง Discord ใช้จริง และ serialize เป็น JSON ได้
+
+SUBSCRIBED_EVENTS = ("push", "pull_request", "issues")
+CHUNK_SIZE = 64 * 1024
+
+WEBHOOK_VERIFY_SECONDS = metrics.histogram("webhook_verify_seconds", "Time spent streaming the body and verifying the HMAC signature.")
+WEBHOOK_PARSE_SECONDS = metrics.histogram("webhook_parse_seconds", "Time spent parsing and normalising the webhook payload.")
+WEBHOOK_HANDOFF_SECONDS = metrics.histogram("webhook_handoff_seconds", "Time spent handing a normalised event to the delivery queue.")
+WEBHOOK_EVENTS = metrics.counter("webhook_events_total", "Webhook deliveries by event type and outcome.", ("event", "outcome"))
+WEBHOOK_REJECTED_SIGNATURES = metrics.counter("webhook_rejected_signatures_total", "Webhook deliveries rejected for a missing or invalid signature.")
+WEBHOOK_DROPPED_EVENTS = metrics.counter("webhook_dropped_events_total", "Webhook deliveries dropped before reaching the queue.", ("reason",))
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_signed_body(request, secret, signature, max_body):
+    # อ่าน body ทีละ chunk พร้อมคำนวณ HMAC ไปด้วย และหยุดทันทีที่เกินขนาดที่กำหนด
+    if request.content_length is not None and request.content_length > max_body:
+        raise BodyTooLarge()
+    mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+    chunks = []
+    size = 0
+    async for chunk in request.content.iter_chunked(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_body:
+            raise BodyTooLarge()
+        mac.update(chunk)
+        chunks.append(chunk)
+    body = b"".join(chunks)
+    return body, hmac.compare_digest("sha256=" + mac.hexdigest(), signature)
+
+def _repository(payload):
+    repository = payload.get("repository") or {}
+    return {
+        "name": repository.get("name"),
+        "full_name": repository.get("full_name") or repository.get("name"),
+        "html_url": repository.get("html_url"),
+    }
+
+def _commit(commit):
+    if not commit:
+        return None
+    return {
+        "message": commit.get("message", ""),
+        "url": commit.get("url"),
+        "author": {"name": (commit.get("author") or {}).get("name")},
+    }
+
+def normalize_event(event, delivery_id, payload):
+    # คืน None ถ้าเป็น event ที่ไม่ต้องส่งต่อ
+    if event == "push":
+        if not payload.get("ref", "").startswith("refs/heads/"):
+            return None
+        return {
+            "event": event,
+            "delivery": delivery_id,
+            "repository": _repository(payload),
+            "ref": payload["ref"],
+            "before": payload.get("before"),
+            "after": payload.get("after"),
+            "compare": payload.get("compare"),
+            # จาก commits ใช้แค่ชื่อผู้เขียน (นับจำนวน + รายชื่อ) ส่วนรายละเอียดใช้จาก head_commit
+            "commits": [{"author": {"name": (commit.get("author") or {}).get("name")}} for commit in payload.get("commits") or []],
+            "head_commit": _commit(payload.get("head_commit")),
+        }
+    if event in ("pull_request", "issues"):
+        item_key = "pull_request" if event == "pull_request" else "issue"
+        return {
+            "event": event,
+            "delivery": delivery_id,
+            "action": payload.get("action"),
+            "repository": _repository(payload),
+            item_key: {"state": (payload.get(item_key) or {}).get("state")},
+        }
+    return None
+
+def make_webhook_handler(secret, dispatch, retry_after=10, dedup=None, max_body=5 * 1024 * 1024):
+    # dispatch(event) -> True ถ้ารับไว้แล้ว, False ถ้าคิวปลายทางเต็ม (ตอบ 503 ให้ GitHub ส่งใหม่)
+    async def handle_webhook(request):
+        event_name = request.headers.get("X-GitHub-Event")
+        # event ที่ไม่ได้ subscribe ตอบกลับเลยจาก header ไม่ต้องอ่านหรือ parse body
+        if event_name not in SUBSCRIBED_EVENTS:
+            # header นี้ใครก็ส่งมาได้ก่อนตรวจลายเซ็น ห้ามใช้เป็น label ตรง ๆ ไม่งั้นจำนวน series โตไม่จำกัด
+            WEBHOOK_EVENTS.labels("other", "unsubscribed").inc()
+            print(f"Received GitHub event: {event_name}. Ignoring.")
+            return web.Response(text="OK")
+
+        signature = request.headers.get("X-Hub-Signature-256")
+        if not secret:
+            print("ERROR: GITHUB_WEBHOOK_SECRET is not set.")
+            WEBHOOK_REJECTED_SIGNATURES.inc()
+            return web.Response(status=401, text="Invalid signature")
+        if not signature:
+            print("Webhook received with Invalid signature.")
+            WEBHOOK_REJECTED_SIGNATURES.inc()
+            return web.Response(status=401, text="Invalid signature")
+        try:
+            with WEBHOOK_VERIFY_SECONDS.time():
+                body, valid = await read_signed_body(request, secret, signature, max_body)
+        except BodyTooLarge:
+            print(f"Webhook body exceeds {max_body} bytes, rejecting {event_name} event.")
+            WEBHOOK_DROPPED_EVENTS.labels("too_large").inc()
+            return web.Response(status=413, text="Payload too large")
+        if not valid:
+            print("Webhook received with Invalid signature.")
+            WEBHOOK_REJECTED_SIGNATURES.inc()
+            return web.Response(status=401, text="Invalid signature")
+
+        delivery_id = request.headers.get("X-GitHub-Delivery")
+        # ตรวจซ้ำหลัง verify (กัน request ปลอมมาจอง id) แต่ก่อน parse JSON
+        if dedup is not None and not await dedup.claim(delivery_id):
+            print(f"Duplicate delivery {delivery_id} ({event_name}). Ignoring.")
+            WEBHOOK_EVENTS.labels(event_name, "duplicate").inc()
+            return web.Response(text="OK")
+        # id ถือว่ารับแล้วจริงก็ต่อเมื่อส่งต่อสำเร็จ ทางอื่นทุกทาง (รวม exception) ต้องคืน id ให้ GitHub ส่งซ้ำได้
+        try:
+            response = await process_delivery(event_name, delivery_id, body)
+        except BaseException:
+            if dedup is not None:
+                await dedup.release(delivery_id)
+            raise
+        if response.status != 200 and dedup is not None:
+            await dedup.release(delivery_id)
+        return response
+
+    async def process_delivery(event_name, delivery_id, body):
+        try:
+            with WEBHOOK_PARSE_SECONDS.time():
+                payload = loads_json(body)
+                if not isinstance(payload, dict):
+                    raise ValueError("payload is not a JSON object")
+                event = normalize_event(event_name, delivery_id, payload)
+        except (JSONDecodeError, UnicodeDecodeError, ValueError, TypeError, AttributeError, KeyError) as e:
+            print(f"Failed to decode webhook JSON payload: {e!r}")
+            WEBHOOK_DROPPED_EVENTS.labels("invalid_json").inc()
+            return web.Response(status=400, text="Invalid JSON")
+
+        if event is None:
+            WEBHOOK_EVENTS.labels(event_name, "ignored").inc()
+            print(f"Received GitHub event: {event_name}. Ignoring.")
+            return web.Response(text="OK")
+
+        with WEBHOOK_HANDOFF_SECONDS.time():
+            accepted = await dispatch(event)
+        if not accepted:
+            WEBHOOK_DROPPED_EVENTS.labels("queue_full").inc()
+            print(f"Webhook backlog is full, rejecting {event_name} event for repo {event['repository']['full_name']}")
+            return web.Response(status=503, text="Queue full", headers={"Retry-After": str(retry_after)})
+        WEBHOOK_EVENTS.labels(event_name, "accepted").inc()
+        print(f"Received and queued {event_name} event for repo {event['repository']['full_name']}")
+        return web.Response(text="OK")
+
+    return handle_webhook
+
+async def handle_metrics(request):
+    return web.Response(body=metrics.REGISTRY.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+# --------------------------------------------------------------------------------
+## Bounded Webhook Delivery Queue
+# --------------------------------------------------------------------------------
+# คิวขนาดจำกัด + worker จำนวนคงที่ แทนการ create_task ทีละ event
+# ถ้าคิวเต็ม submit() จะคืน False เพื่อให้ฝั่ง HTTP ตอบ 503 + Retry-After กลับไปที่ GitHub
+
+class WebhookQueue:
+    def __init__(self, handler, maxsize=100, workers=4):
+        self.handler = handler
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.worker_count = max(1, workers)
+        self.workers = []
+        self.closing = False
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        if self.workers:
+            return
+        self.closing = False
+        for worker_id in range(self.worker_count):
+            self.workers.append(asyncio.create_task(self._worker(worker_id)))
+        print(f"📥 Webhook queue started with {self.worker_count} worker(s), capacity {self.queue.maxsize}.")
+
+    def submit(self, item):
+        if self.closing:
+            self.rejected += 1
+            return False
+        try:
+            self.queue.put_nowait((time.monotonic(), item))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _worker(self, worker_id):
+        while True:
+            enqueued_at, item = await self.queue.get()
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Webhook worker {worker_id} failed to process event: {e}")
+            finally:
+                latency = time.monotonic() - enqueued_at
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.queue.task_done()
+
+    async def drain(self, timeout=30.0):
+        # หยุดรับงานใหม่ แล้วรอให้งานที่ค้างอยู่ในคิวทำจนเสร็จก่อนปิด worker
+        self.closing = True
+        if self.workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"WARNING: Webhook queue drain timed out with {self.queue.qsize()} event(s) left.")
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    def stats(self):
+        finished = self.processed + self.failed
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "workers": len(self.workers),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "latency_avg_ms": round(self.latency_total / finished * 1000, 2) if finished else 0.0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+        }